@@ -0,0 +1,180 @@
+"""asyncio front-end for SearchEngine backed by a bounded thread pool."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from search_food import DB, SearchEngine
+
+
+class SearchOverloaded(RuntimeError):
+    """Raised instead of queueing when the pool is saturated and reject=True."""
+
+
+class _Job:
+    """Tracks which worker engine is running a call so it can be interrupted."""
+
+    __slots__ = ("engine", "done", "lock")
+
+    def __init__(self):
+        self.engine = None
+        self.done = False
+        self.lock = threading.Lock()
+
+    def interrupt(self):
+        with self.lock:
+            if self.engine is not None and not self.done:
+                self.engine.interrupt()
+
+
+class AsyncSearchEngine:
+    """
+    Non-blocking search for asyncio services.
+    SQLite reads run on a dedicated pool of `workers` threads, each with its
+    own SearchEngine (and connection). At most `max_pending` calls are in
+    flight; further callers wait for a slot, or get SearchOverloaded when
+    `reject=True`. Cancelling a call or hitting its timeout interrupts the
+    running SQLite statement.
+    """
+
+    def __init__(
+        self,
+        db_path=DB,
+        workers: int = 4,
+        max_pending: int = 64,
+        timeout: float | None = None,
+        reject: bool = False,
+        **engine_kwargs,
+    ):
+        self.db_path = Path(db_path)
+        self.timeout = timeout
+        self.reject = reject
+        self.max_pending = max_pending
+        self._engine_kwargs = engine_kwargs
+        self._local = threading.local()
+        self._engines: List[SearchEngine] = []
+        self._engines_lock = threading.Lock()
+        self._slots = asyncio.Semaphore(max_pending)
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="nutrition-search"
+        )
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _engine(self) -> SearchEngine:
+        engine = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = SearchEngine(self.db_path, **self._engine_kwargs)
+            self._local.engine = engine
+            with self._engines_lock:
+                self._engines.append(engine)
+        return engine
+
+    def _run(self, job: _Job, method: str, args: tuple):
+        engine = self._engine()
+        with job.lock:
+            if job.done:  # 排队期间已被取消
+                return None
+            job.engine = engine
+        try:
+            return getattr(engine, method)(*args)
+        finally:
+            with job.lock:
+                job.done = True
+
+    def _release(self):
+        self._pending -= 1
+        self._slots.release()
+
+    def _finished(self, loop, _fut):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # 事件循环已关闭
+
+    async def _submit(self, method: str, args: tuple, timeout: float | None):
+        if self.reject and self._slots.locked():
+            raise SearchOverloaded(f"{self._pending} searches already in flight")
+        timeout = self.timeout if timeout is None else timeout
+        await self._slots.acquire()
+        job = _Job()
+        loop = asyncio.get_running_loop()
+        try:
+            cfut = self._executor.submit(self._run, job, method, args)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._pending += 1
+        # 名额随工作线程归还：超时 / 取消后语句可能仍在运行，结束前不能放行新请求
+        cfut.add_done_callback(partial(self._finished, loop))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(cfut), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            job.interrupt()
+            with job.lock:
+                job.done = True
+            raise
+
+    async def search(
+        self,
+        q: str,
+        limit: int = 5,
+        timeout: float | None = None,
+        include_tags: Sequence[str] = (),
+        exclude_tags: Sequence[str] = (),
+        fields: Sequence[str] | None = None,
+    ) -> List[dict]:
+        fields = tuple(fields) if fields is not None else None
+        args = (q, limit, tuple(include_tags), tuple(exclude_tags), fields)
+        return await self._submit("search", args, timeout)
+
+    async def search_many(
+        self,
+        queries: Sequence[str],
+        limit: int = 5,
+        timeout: float | None = None,
+        include_tags: Sequence[str] = (),
+        exclude_tags: Sequence[str] = (),
+        fields: Sequence[str] | None = None,
+    ) -> Dict[str, List[dict]]:
+        fields = tuple(fields) if fields is not None else None
+        args = (list(queries), limit, tuple(include_tags), tuple(exclude_tags), fields)
+        return await self._submit("search_many", args, timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._engines_lock:
+            for engine in self._engines:
+                engine.close()
+            self._engines.clear()
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+if __name__ == "__main__":
+
+    async def demo():
+        async with AsyncSearchEngine(timeout=1.0) as engine:
+            terms = ["roti canai", "teh tarik", "nasi lemk"]
+            results = await asyncio.gather(*(engine.search(t, 3) for t in terms))
+            for term, rows in zip(terms, results):
+                print(term, "->", [r["id"] for r in rows])
+            batch = await engine.search_many(terms, 1)
+            print({q: [r["id"] for r in rows] for q, rows in batch.items()})
+
+    asyncio.run(demo())
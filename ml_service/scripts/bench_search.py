@@ -0,0 +1,883 @@
+#!/usr/bin/env python3
+"""Benchmarks for search_food against synthetic nutrition catalogs."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Sequence
+
+import numpy as np
+
+import build_nutrition_db as build
+from food_text import CJK_RE
+from search_food import (
+    DB,
+    SQL_FTS,
+    SQL_FTS_PAGE,
+    SQL_LIKE,
+    SQL_LIKE_PAGE,
+    SQL_SUBSTRING,
+    SQL_SUBSTRING_PAGE,
+    SearchEngine,
+    StageStats,
+    fts_query,
+    sql,
+    trigram_query,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+BENCH_DIR = ROOT / "data" / "bench"
+CURATED_FILES = ("local_additions.json", "myfcd_clean.json")
+
+INSERT_FOOD = """INSERT INTO foods
+(id,name,short_name,category,quantity,brands,food_groups,energy_kcal,protein_g,fat_g,sat_fat_g,carb_g,sugar_g,fiber_g,sodium_mg,source)
+VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+BATCH_ROWS = 50_000
+
+
+def load_vocabulary() -> List[str]:
+    words = set()
+    for name in CURATED_FILES:
+        path = build.CUR / name
+        if not path.exists():
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for item in json.load(f):
+                text = " ".join([item.get("name") or ""] + (item.get("aliases") or []))
+                for w in build.clean_name(text, max_tokens=64).split():
+                    if w.isalpha() and len(w) > 2:
+                        words.add(w)
+    return sorted(words)
+
+
+class CatalogProfile:
+    """Distributions observed in the curated JSON, used to draw synthetic foods."""
+
+    def __init__(self, items: Sequence[dict], local: Sequence[dict]):
+        # 品牌商品模板：(品牌, 产品段..., 类别)；重复保留，按出现频率抽样
+        self.templates: List[tuple] = []
+        self.segments: List[str] = []
+        self.words: List[str] = []
+        for item in items:
+            parts = [p.strip() for p in (item.get("name") or "").split(",")]
+            parts = [p for p in parts if p]
+            if len(parts) < 2:
+                continue
+            self.templates.append((parts, item.get("category")))
+            self.segments.extend(parts[2:])
+            for p in parts[1:]:
+                self.words.extend(w for w in p.split() if w.isalpha())
+        self.branded_share = len(self.templates) / max(1, len(items) + len(local))
+        self.dishes = [item for item in local if item.get("name")]
+        self.dish_words = sorted(
+            {
+                w
+                for item in self.dishes
+                for text in [item["name"], *(item.get("aliases") or [])]
+                for w in re.findall(r"[a-z]{3,}", text.lower())
+            }
+        )
+        self.cjk_aliases = [
+            a
+            for item in self.dishes
+            for a in item.get("aliases") or []
+            if CJK_RE.search(a)
+        ]
+        self.cjk_chars = sorted(
+            {c for a in self.cjk_aliases for c in a if CJK_RE.match(c)}
+        )
+        self.nutrients: Dict[str, List[dict]] = {}
+        for item in [*items, *local]:
+            n = build.select_nutrients(item)
+            if n:
+                self.nutrients.setdefault(item.get("category"), []).append(n)
+
+    @classmethod
+    def from_curated(cls) -> "CatalogProfile":
+        def load(name):
+            path = build.CUR / name
+            if not path.exists():
+                return []
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        return cls(load("myfcd_clean.json"), load("local_additions.json"))
+
+    def _mutate(self, segment: str, rng: random.Random) -> str:
+        """A real product segment with one word swapped, so names stay plausible."""
+        words = segment.split()
+        if words and self.words and rng.random() < 0.7:
+            words[rng.randrange(len(words))] = rng.choice(self.words)
+        return " ".join(words)
+
+    def _cjk_alias(self, base: str, rng: random.Random) -> str:
+        return base + "".join(rng.sample(self.cjk_chars, rng.randint(1, 2)))
+
+    def item(self, i: int, rng: random.Random) -> dict:
+        """One synthetic food in the curated JSON schema."""
+        if self.templates and rng.random() < self.branded_share:
+            # 品牌与类别沿用模板，产品名换词，其余段从全部段中重抽。
+            # 模板按出现频率抽样，品牌分布随之保持真实的长尾（NESTLE 居多）
+            parts, category = rng.choice(self.templates)
+            rest = [rng.choice(self.segments or parts[1:]) for _ in parts[2:]]
+            parts = [parts[0], *(self._mutate(p, rng) for p in [parts[1], *rest])]
+            name, aliases, brands = ", ".join(parts), [], [parts[0]]
+        else:
+            dish = rng.choice(self.dishes)
+            extra = rng.sample(self.dish_words, rng.randint(0, 2))
+            name = " ".join([dish["name"], *extra])
+            aliases, brands = [], []  # 本地菜式没有品牌
+            for alias in dish.get("aliases") or []:
+                if CJK_RE.search(alias):
+                    aliases.append(self._cjk_alias(alias, rng))
+                else:
+                    aliases.append(" ".join([alias, *extra]))
+            category = dish.get("category")
+        pool = self.nutrients.get(category) or [
+            n for group in self.nutrients.values() for n in group
+        ]
+        nutrients = {
+            k: round(v * rng.uniform(0.8, 1.2), 2)
+            for k, v in rng.choice(pool).items()
+            if isinstance(v, (int, float))
+        }
+        return {
+            "id": str(i),
+            "name": name,
+            "aliases": aliases,
+            "brands": brands,
+            "category": category,
+            "nutrients_per_100g": nutrients,
+        }
+
+    def items(self, rows: int, seed: int = 0) -> Iterator[dict]:
+        rng = random.Random(seed)
+        for i in range(rows):
+            yield self.item(i, rng)
+
+
+def synth_catalog(path: Path, rows: int, seed: int = 0) -> Path:
+    """Write a nutrition.db-shaped catalog of `rows` foods drawn from the profile."""
+    profile = CatalogProfile.from_curated()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    build.create_schema(cur)
+    rows_batch, alias_batch = [], []
+
+    def flush():
+        cur.executemany(INSERT_FOOD, rows_batch)
+        cur.executemany(
+            "INSERT OR REPLACE INTO alias(alias, food_id) VALUES(?,?)", alias_batch
+        )
+        rows_batch.clear()
+        alias_batch.clear()
+
+    for item in profile.items(rows, seed):
+        row, aliases = build.prepare_curated_entry(
+            item, "Synthetic", id_prefix="synth-"
+        )
+        rows_batch.append(row)
+        alias_batch.extend(aliases)
+        if len(rows_batch) >= BATCH_ROWS:
+            flush()
+    flush()
+    build.rebuild_search_indexes(cur)
+    con.commit()
+    con.close()
+    return path
+
+
+def catalog(rows: int, rebuild: bool = False) -> tuple[Path, float | None]:
+    """Cached synthetic catalog and its build time (None when reused)."""
+    path = BENCH_DIR / f"synth-{rows}.db"
+    if rebuild or not path.exists():
+        t0 = time.perf_counter()
+        synth_catalog(path, rows)
+        seconds = time.perf_counter() - t0
+        print(f"🏗️  Built {path.name} in {seconds:.1f}s")
+        return path, seconds
+    return path, None
+
+
+def measure(fn: Callable[[str], object], queries: Sequence[str]) -> Dict[str, float]:
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples: Sequence[float], p95: bool = False) -> Dict[str, float]:
+    samples = sorted(samples)
+
+    def pct(q):
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    out = {"p50_ms": statistics.median(samples)}
+    if p95:
+        out["p95_ms"] = pct(0.95)
+    out["p99_ms"] = pct(0.99)
+    out["mean_ms"] = statistics.fmean(samples)
+    return out
+
+
+def fragments(vocab: Sequence[str], n: int, seed: int = 1) -> List[str]:
+    """Substring probes such as "canai" or "arik", plus a few misses."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        w = rng.choice(vocab)
+        size = rng.randint(3, min(6, len(w)))
+        start = rng.randint(0, len(w) - size)
+        out.append(w[start : start + size])
+    out += ["qqxz", "zzvv", "xjq"] * max(1, n // 50)
+    return out
+
+
+def bench_substring(db: Path, queries: Sequence[str], limit: int) -> Dict[str, dict]:
+    with SearchEngine(db) as engine:
+        con = engine._con
+
+        def trigram(q):
+            params = {"match": trigram_query(q), "limit": limit}
+            return con.execute(sql(SQL_SUBSTRING, False), params).fetchall()
+
+        def like(q):
+            params = {"pattern": f"%{q}%", "limit": limit}
+            return con.execute(sql(SQL_LIKE, False), params).fetchall()
+
+        for q in queries[:20]:
+            trigram(q), like(q)
+        return {"trigram": measure(trigram, queries), "like": measure(like, queries)}
+
+
+def sample_terms(db: Path, n: int, seed: int = 2) -> List[str]:
+    """Real names and aliases from the catalog, as meal analysis would send."""
+    rng = random.Random(seed)
+    con = sqlite3.connect(db)
+    try:
+        total = con.execute("SELECT MAX(rowid) FROM foods").fetchone()[0] or 0
+        rowids = [rng.randint(1, total) for _ in range(n)]
+        names = [
+            r[0]
+            for rid in rowids
+            for r in con.execute("SELECT name FROM foods WHERE rowid = ?", (rid,))
+        ]
+        aliases = [r[0] for r in con.execute("SELECT alias FROM alias LIMIT ?", (n,))]
+    finally:
+        con.close()
+    pool = names + aliases
+    return [rng.choice(pool) for _ in range(n)]
+
+
+def bench_batch(
+    db: Path, queries: Sequence[str], limit: int, sizes: Sequence[int] = (30, 1000)
+) -> Dict[str, dict]:
+    """search_many vs. a loop over SearchEngine.search, per batch size."""
+    results = {}
+    with SearchEngine(db) as engine:
+        engine.search_many(queries[:50], limit)
+        for size in sizes:
+            batches = [
+                queries[i : i + size]
+                for i in range(0, max(len(queries) - size + 1, 1), size)
+            ]
+
+            def loop(batch):
+                return {q: engine.search(q, limit) for q in batch}
+
+            def many(batch):
+                return engine.search_many(batch, limit)
+
+            results[f"loop/{size}"] = measure(loop, batches)
+            results[f"many/{size}"] = measure(many, batches)
+    return results
+
+
+def bench_classify(db: Path) -> Dict[str, dict]:
+    """
+    classify() per row vs. classify_batch() over the catalog's columns
+    (row-for-row agreement lives in tests/test_health_tags.py).
+    """
+    import pandas as pd
+
+    from health_tags import classify_batch
+    from search_food import classify
+
+    con = sqlite3.connect(db)
+    try:
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(build.NUTRIENT_FIELDS)} FROM foods", con
+        )
+    finally:
+        con.close()
+    records = df.to_dict("records")
+
+    t0 = time.perf_counter()
+    for r in records:
+        classify(r)
+    scalar_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    tags, unknown = classify_batch(df)
+    batch_s = time.perf_counter() - t0
+    return {
+        "classify": {"rows": len(df), "total_s": scalar_s},
+        "batch": {"rows": len(df), "total_s": batch_s},
+    }
+
+
+def bench_projection(
+    db: Path, vocab: Sequence[str], n: int, limit: int = 500
+) -> Dict[str, dict]:
+    """Full row dicts vs. FoodHit projections on large FTS result pages."""
+    import tracemalloc
+
+    rng = random.Random(3)
+    queries = [rng.choice(vocab) for _ in range(n)]
+    variants = {"dict": None, "foodhit": ("id", "name", "energy_kcal", "tag_mask")}
+    results = {}
+    with SearchEngine(db, cache_size=0) as engine:
+        for name, fields in variants.items():
+
+            def run(q):
+                return engine.search(q, limit, fields=fields)
+
+            for q in queries[:20]:
+                run(q)
+            stats = measure(run, queries)
+            # 结果仍被持有时的净分配量，即每条命中常驻的内存
+            hits = retained = 0
+            tracemalloc.start()
+            for q in queries[:50]:
+                before = tracemalloc.get_traced_memory()[0]
+                rows = run(q)
+                retained += tracemalloc.get_traced_memory()[0] - before
+                hits += len(rows)
+                del rows
+            tracemalloc.stop()
+            stats["bytes_per_hit"] = retained / max(hits, 1)
+            results[name] = stats
+    return results
+
+
+def bench_cjk(db: Path, limit: int) -> Dict[str, dict]:
+    """
+    Chinese substring probes with and without the foods_cjk stage.
+    Probes are every 1-3 character piece of the catalog's CJK aliases;
+    a food is relevant when its name or one of its aliases contains the
+    probe, and recall is measured against min(relevant, limit).
+    """
+    from food_text import CJK_RE
+
+    con = sqlite3.connect(db)
+    try:
+        texts = con.execute(
+            "SELECT food_id, alias FROM alias UNION ALL SELECT id, name FROM foods"
+        ).fetchall()
+    finally:
+        con.close()
+    probes = sorted(
+        {
+            run[i : i + n]
+            for _, text in texts
+            for run in CJK_RE.findall(text)
+            for n in (1, 2, 3)
+            for i in range(len(run) - n + 1)
+        }
+    )
+    relevant = {p: {fid for fid, text in texts if p in text} for p in probes}
+
+    results = {}
+    with SearchEngine(db, cache_size=0) as engine:
+        variants = {
+            "before": [s for s in engine._stages if s[0] != "cjk"],
+            "cjk": list(engine._stages),
+        }
+        for name, stages in variants.items():
+
+            def run(q):
+                sq = engine._query(q, limit, (), (), ("id",))
+                return engine._run_stages(engine._con.cursor(), sq, stages)[1]
+
+            stats = measure(run, probes)
+            recall = [
+                len({h.id for h in run(p)} & relevant[p]) / min(len(relevant[p]), limit)
+                for p in probes
+            ]
+            stats["recall"] = statistics.fmean(recall)
+            stats["probes"] = len(probes)
+            results[name] = stats
+    return results
+
+
+OCR_CONFUSIONS = {"o": "0", "i": "l", "l": "1", "e": "c", "s": "5", "a": "@", "n": "m"}
+
+
+def ocr_noise(text: str, rng: random.Random) -> str:
+    """Menu-line style corruption: OCR swaps, a dropped char, price/qty tails."""
+    chars = list(text)
+    for i, c in enumerate(chars):
+        if c.lower() in OCR_CONFUSIONS and rng.random() < 0.08:
+            chars[i] = OCR_CONFUSIONS[c.lower()]
+    if len(chars) > 4 and rng.random() < 0.5:
+        del chars[rng.randrange(len(chars))]
+    out = "".join(chars)
+    if rng.random() < 0.5:
+        out = out.upper()
+    if rng.random() < 0.5:
+        out += rng.choice([" RM5.50", " x2", " (L)", " 1pc", " - ice"])
+    return out
+
+
+def bench_names(db: Path, n: int, k: int = 5) -> Dict[str, dict]:
+    """
+    match_names vs. SearchEngine.search on OCR-noised names and aliases
+    labelled with their food id: queries/sec and recall@1 / recall@k.
+    """
+    from name_match import SQL_NAME_ENTRIES, load_matcher
+
+    rng = random.Random(4)
+    con = sqlite3.connect(db)
+    try:
+        entries = [(fid, text) for _, fid, text in con.execute(SQL_NAME_ENTRIES)]
+    finally:
+        con.close()
+    sample = [rng.choice(entries) for _ in range(n)]
+    texts = [ocr_noise(text, rng) for _, text in sample]
+    labels = [fid for fid, _ in sample]
+
+    def summary(ranked, seconds):
+        return {
+            "qps": len(texts) / seconds,
+            "recall@1": statistics.fmean(
+                bool(r) and r[0] == fid for r, fid in zip(ranked, labels)
+            ),
+            f"recall@{k}": statistics.fmean(
+                fid in r[:k] for r, fid in zip(ranked, labels)
+            ),
+        }
+
+    matcher = load_matcher(db)
+    matcher.match_names(texts[:50], k)
+    t0 = time.perf_counter()
+    matched = [[fid for fid, _ in m] for m in matcher.match_names(texts, k)]
+    results = {"tfidf": summary(matched, time.perf_counter() - t0)}
+
+    with SearchEngine(db, cache_size=0) as engine:
+        t0 = time.perf_counter()
+        found = [[r["id"] for r in engine.search(t, k)] for t in texts]
+        results["search"] = summary(found, time.perf_counter() - t0)
+    return results
+
+
+def range_filters(db: Path, n: int, seed: int = 5) -> List[list]:
+    """2-4 nutrient bounds at random quantiles, half with a category clause."""
+    rng = random.Random(seed)
+    con = sqlite3.connect(db)
+    try:
+        cats = [
+            r[0]
+            for r in con.execute(
+                "SELECT category FROM foods WHERE category IS NOT NULL "
+                "GROUP BY category ORDER BY COUNT(*) DESC LIMIT 20"
+            )
+        ]
+        sample = {
+            f: sorted(
+                r[0]
+                for r in con.execute(
+                    f"SELECT {f} FROM foods WHERE {f} IS NOT NULL "
+                    "ORDER BY random() LIMIT 1000"
+                )
+            )
+            for f in build.NUTRIENT_FIELDS
+        }
+    finally:
+        con.close()
+    filters = []
+    for _ in range(n):
+        preds = []
+        for field in rng.sample(build.NUTRIENT_FIELDS, rng.randint(2, 4)):
+            values = sample[field] or [0.0]
+            op = rng.choice(["<", ">", "<=", ">="])
+            q = rng.uniform(0.3, 0.9) if op in ("<", "<=") else rng.uniform(0.1, 0.7)
+            preds.append((field, op, values[int(q * (len(values) - 1))]))
+        if cats and rng.random() < 0.5:
+            preds.append(("category", "=", rng.choice(cats)))
+        filters.append(preds)
+    return filters
+
+
+def bench_ranges(db: Path, n: int) -> Dict[str, dict]:
+    """NumPy masks over the mmap column store vs. the same filter in SQL."""
+    from nutrient_store import open_store
+
+    store = open_store(db)
+    filters = range_filters(db, n)
+    con = sqlite3.connect(db)
+    fields = ", ".join(build.NUTRIENT_FIELDS)
+
+    def sql_filter(preds):
+        where = " AND ".join(
+            "category = ? COLLATE NOCASE" if f == "category" else f"{f} {op} ?"
+            for f, op, _ in preds
+        )
+        params = [v for *_, v in preds]
+        return con.execute(
+            f"SELECT id, {fields} FROM foods WHERE {where}", params
+        ).fetchall()
+
+    def columns(preds):
+        return store.query(preds)
+
+    try:
+        sql_counts = [len(sql_filter(p)) for p in filters]
+        col_counts = [len(columns(p).ids) for p in filters]
+        results = {"sql": measure(sql_filter, filters)}
+        results["columns"] = measure(columns, filters)
+    finally:
+        con.close()
+    results["columns"]["mean_rows"] = statistics.fmean(col_counts)
+    # float32 列与 REAL 在阈值附近的舍入差异
+    mismatched = sum(a != b for a, b in zip(sql_counts, col_counts))
+    results["columns"]["mismatched"] = mismatched
+    return results
+
+
+def bench_similar(db: Path, n: int, k: int = 5) -> Dict[str, dict]:
+    """similar() latency for random foods, within the category and across all."""
+    from similar_foods import SimilarIndex
+
+    index = SimilarIndex(db)
+    rng = random.Random(6)
+    ids = index.store.ids(np.asarray(rng.sample(range(index.store.rows), n)))
+    results = {}
+    for name, same in (("category", True), ("all", False)):
+        for food_id in ids[:10]:
+            index.similar(food_id, k, same)
+        results[name] = measure(lambda f: index.similar(f, k, same), ids)
+    return results
+
+
+def bench_pages(
+    db: Path, vocab: Sequence[str], size: int = 20, pages=(1, 10, 50, 100), reps=20
+) -> Dict[str, dict]:
+    """
+    Latency of fetching page N of a broad query: keyset (seek past the
+    previous page's last score / rowid) vs. LIMIT ... OFFSET.
+    """
+    with SearchEngine(db, cache_size=0) as engine:
+        con = engine._con
+        # 命中最多的词，保证能翻到第 max(pages) 页
+        word = max(
+            vocab[:300],
+            key=lambda w: con.execute(
+                "SELECT count(*) FROM foods_fts WHERE foods_fts MATCH ?",
+                (fts_query(w),),
+            ).fetchone()[0],
+        )
+        w_name, w_aliases = engine.fts_weights
+        frag = word[:3]
+        probes = {
+            "fts": (
+                SQL_FTS,
+                SQL_FTS_PAGE,
+                {"match": fts_query(word), "w_name": w_name, "w_aliases": w_aliases},
+            ),
+            "substring": (
+                SQL_SUBSTRING,
+                SQL_SUBSTRING_PAGE,
+                {"match": trigram_query(frag)},
+            ),
+            "like": (SQL_LIKE, SQL_LIKE_PAGE, {"pattern": f"%{frag}%"}),
+        }
+        results = {}
+        for stage, (template, page_template, params) in probes.items():
+            params = {**params, "limit": size}
+            offset_sql = sql(template, False) + " OFFSET :offset"
+            page_sql = sql(page_template, False)
+            # 先顺序翻一遍，记下每页开头的游标位置
+            after, starts = (None, None), []
+            for _ in range(max(pages)):
+                starts.append(after)
+                rows = con.execute(
+                    page_sql, {**params, "score": after[0], "rowid": after[1]}
+                ).fetchall()
+                if len(rows) < size:
+                    break
+                after = (rows[-1][0], rows[-1][1])
+            for page in pages:
+                if page > len(starts):
+                    break
+                score, rowid = starts[page - 1]
+                keyset = measure(
+                    lambda _: con.execute(
+                        page_sql, {**params, "score": score, "rowid": rowid}
+                    ).fetchall(),
+                    range(reps),
+                )
+                offset = measure(
+                    lambda _: con.execute(
+                        offset_sql, {**params, "offset": (page - 1) * size}
+                    ).fetchall(),
+                    range(reps),
+                )
+                results[f"{stage} p{page}"] = {
+                    "keyset_p50_ms": keyset["p50_ms"],
+                    "offset_p50_ms": offset["p50_ms"],
+                }
+        print(f"  fts query {word!r}, substring / like query {frag!r}")
+        return results
+
+
+def bench_stages(db: Path, queries: Sequence[str]) -> Dict[str, dict]:
+    """
+    resolve() with and without StageStats (cache off), then the recorded
+    per-stage p50 / p95 / p99.
+    """
+    stats = StageStats()
+    plain = SearchEngine(db, cache_size=0)
+    timed = SearchEngine(db, cache_size=0, stats=stats)
+    try:
+        for q in queries[:20]:
+            plain.resolve(q), timed.resolve(q)
+        stats.reset()
+        results = {
+            "off": measure(plain.resolve, queries),
+            "on": measure(timed.resolve, queries),
+        }
+    finally:
+        plain.close()
+        timed.close()
+    snapshot = stats.snapshot()
+    for stage, st in snapshot["stages"].items():
+        results[stage] = {
+            k: st[k] for k in ("count", "p50_ms", "p95_ms", "p99_ms", "rows")
+        }
+        results[stage]["answered"] = snapshot["answered"].get(stage, 0)
+    return results
+
+
+def misspell(term: str, edits: int, rng: random.Random) -> str:
+    """`edits` random insert / delete / substitute operations on letters."""
+    for _ in range(edits):
+        i = rng.randrange(1, max(2, len(term)))
+        c = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        op = rng.randrange(3)
+        if op == 0:
+            term = term[:i] + c + term[i:]
+        elif op == 1 and len(term) > 3:
+            term = term[:i] + term[i + 1 :]
+        else:
+            term = term[:i] + c + term[i + 1 :]
+    return term
+
+
+def bench_suggest(db: Path, n: int, k: int = 3) -> Dict[str, dict]:
+    """
+    Zero-result queries (known terms with 2-4 edits that every stage
+    misses): cost of the failed resolve() vs. suggest(), and how often the
+    original term is among the top-k suggestions.
+    """
+    rng = random.Random(8)
+    with SearchEngine(db, cache_size=0) as engine:
+        if "suggest_deletes" not in engine._tables:
+            print(f"  {db.name} has no suggest_deletes; rebuild it with --rebuild")
+            return {}
+        terms = [
+            r[0]
+            for r in engine._con.execute(
+                "SELECT term FROM suggest_vocab WHERE len >= 6 ORDER BY term"
+            )
+        ]
+        rng.shuffle(terms)
+        misses = []
+        for term in terms:
+            q = misspell(term, rng.randint(2, 4), rng)
+            if engine.resolve(q)[0] is None:
+                misses.append((q, term))
+            if len(misses) >= n:
+                break
+        queries = [q for q, _ in misses]
+        found = sum(
+            term in [s.term for s in engine.suggest(q, k)] for q, term in misses
+        )
+        results = {
+            "resolve": measure(engine.resolve, queries),
+            "suggest": measure(lambda q: engine.suggest(q, k), queries),
+        }
+    results["suggest"][f"recall@{k}"] = found / max(1, len(misses))
+    results["suggest"]["queries"] = len(misses)
+    return results
+
+
+def _rss_kib() -> int:
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _serving_probe(db: str, mode: str, queries: Sequence[str], out) -> None:
+    """Runs in a fresh process so every mode starts with a cold connection."""
+    rss0 = _rss_kib()
+    t0 = time.perf_counter()
+    engine = SearchEngine(
+        db, cache_size=0, serving=mode == "serving", memory=mode == "memory"
+    )
+    open_ms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    engine.search(queries[0])
+    cold_ms = (time.perf_counter() - t0) * 1000
+    for q in queries:
+        engine.search(q)
+    warm = measure(engine.search, queries)
+    rss1 = _rss_kib()
+    # 第二个引擎：memory 模式应复用同一份内存库
+    SearchEngine(
+        db, cache_size=0, serving=mode == "serving", memory=mode == "memory"
+    ).close()
+    out.put(
+        {
+            "open_ms": open_ms,
+            "cold_ms": cold_ms,
+            **{f"warm_{k}": v for k, v in warm.items()},
+            "rss_delta_mib": (rss1 - rss0) / 1024,
+            "rss_2nd_engine_mib": (_rss_kib() - rss1) / 1024,
+        }
+    )
+
+
+def bench_serving(db: Path, queries: Sequence[str]) -> Dict[str, dict]:
+    """Default read-write open vs. read-only mmap serving vs. in-memory copy."""
+    import multiprocessing as mp
+
+    ctx = mp.get_context("spawn")
+    results = {}
+    for mode in ("default", "serving", "memory"):
+        out = ctx.Queue()
+        proc = ctx.Process(
+            target=_serving_probe, args=(str(db), mode, list(queries), out)
+        )
+        proc.start()
+        results[mode] = out.get()
+        proc.join()
+    return results
+
+
+def report(title: str, results: Dict[str, dict]) -> None:
+    print(f"\n=== {title} ===")
+    for name, stats in results.items():
+        cells = "  ".join(
+            f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+            for k, v in stats.items()
+        )
+        print(f"{name:>10}  {cells}")
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="*",
+        default=[100_000, 1_000_000],
+        help="catalog sizes to benchmark",
+    )
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument(
+        "--db", type=Path, default=DB, help="catalog for the cjk / names benchmarks"
+    )
+    parser.add_argument(
+        "--bench",
+        nargs="+",
+        choices=[
+            "substring",
+            "batch",
+            "classify",
+            "serving",
+            "projection",
+            "cjk",
+            "names",
+            "ranges",
+            "similar",
+            "pages",
+            "stages",
+            "suggest",
+        ],
+        default=["substring", "batch"],
+    )
+    args = parser.parse_args(argv)
+
+    if "cjk" in args.bench:
+        report(f"cjk @ {args.db.name}", bench_cjk(args.db, args.limit))
+    if "suggest" in args.bench:
+        report(f"did you mean @ {args.db.name}", bench_suggest(args.db, args.queries))
+    if "names" in args.bench:
+        report(
+            f"noisy names @ {args.db.name}",
+            bench_names(args.db, args.queries * 4, args.limit),
+        )
+    vocab = load_vocabulary()
+    for rows in args.rows:
+        db, _ = catalog(rows, rebuild=args.rebuild)
+        if "substring" in args.bench:
+            report(
+                f"substring @ {rows:,} rows",
+                bench_substring(db, fragments(vocab, args.queries), args.limit),
+            )
+        if "batch" in args.bench:
+            report(
+                f"batch (ms per batch) @ {rows:,} rows",
+                bench_batch(db, sample_terms(db, args.queries * 10), args.limit),
+            )
+        if "serving" in args.bench:
+            report(
+                f"default / serving / memory @ {rows:,} rows",
+                bench_serving(
+                    db, sample_terms(db, args.queries) + fragments(vocab, args.queries)
+                ),
+            )
+        if "projection" in args.bench:
+            report(
+                f"projection (limit 500) @ {rows:,} rows",
+                bench_projection(db, vocab, args.queries),
+            )
+        if "ranges" in args.bench:
+            report(
+                f"nutrient range filters @ {rows:,} rows",
+                bench_ranges(db, args.queries),
+            )
+        if "similar" in args.bench:
+            report(f"similar foods @ {rows:,} rows", bench_similar(db, args.queries))
+        if "pages" in args.bench:
+            report(f"deep pages (20 per page) @ {rows:,} rows", bench_pages(db, vocab))
+        if "stages" in args.bench:
+            queries = sample_terms(db, args.queries) + fragments(vocab, args.queries)
+            random.Random(7).shuffle(queries)
+            report(f"per-stage timing @ {rows:,} rows", bench_stages(db, queries))
+        if "suggest" in args.bench:
+            report(
+                f"did you mean (zero-result queries) @ {rows:,} rows",
+                bench_suggest(db, args.queries),
+            )
+        if "classify" in args.bench:
+            report(f"classify @ {rows:,} rows", bench_classify(db))
+
+
+if __name__ == "__main__":
+    main()
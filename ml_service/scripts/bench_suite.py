@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""Search benchmark suite: realistic synthetic catalogs + mixed query workloads.
+
+  python bench_suite.py --rows 10000 100000 1000000 5000000
+  python bench_suite.py --compare data/bench/results/a.json data/bench/results/b.json
+
+Catalogs come from bench_search.synth_catalog: foods drawn from the
+curated JSON (brand / product / variant segments of MyFCD names, hawker
+dishes with their Latin and Chinese aliases, category and nutrient
+profiles), loaded through the same prepare_curated_entry() +
+rebuild_search_indexes() path as the real build.
+Results are written as JSON so two runs can be compared.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from bench_search import BENCH_DIR, catalog, summarize
+from food_text import CJK_RE
+from search_food import RANK_WEIGHTS, SearchEngine
+
+RESULTS_DIR = BENCH_DIR / "results"
+# mixed 负载中各类查询的占比
+MIX = {"exact": 0.30, "alias": 0.25, "substring": 0.20, "typo": 0.15, "cjk": 0.10}
+
+
+def typo(text: str, rng: random.Random) -> str:
+    """One insert / delete / substitute / transpose in a word of 4+ letters."""
+    words = text.split()
+    long = [i for i, w in enumerate(words) if len(w) >= 4 and w.isalpha()]
+    if not long:
+        return text
+    i = rng.choice(long)
+    w = words[i]
+    j = rng.randrange(1, len(w) - 1)
+    op = rng.randrange(4)
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    if op == 0:
+        w = w[:j] + letter + w[j:]
+    elif op == 1:
+        w = w[:j] + w[j + 1 :]
+    elif op == 2:
+        w = w[:j] + letter + w[j + 1 :]
+    else:
+        w = w[: j - 1] + w[j] + w[j - 1] + w[j + 1 :]
+    words[i] = w
+    return " ".join(words)
+
+
+def workloads(db: Path, n: int, seed: int = 0) -> Dict[str, List[str]]:
+    """
+    Queries drawn from the catalog itself: full names as typed, non-name
+    aliases, 3-6 letter fragments, short names with one typo, and Chinese
+    aliases or 2-3 character pieces of them. "mixed" interleaves them by MIX.
+    """
+    rng = random.Random(seed)
+    con = sqlite3.connect(db)
+    try:
+        total = con.execute("SELECT max(rowid) FROM foods").fetchone()[0]
+        sample = rng.sample(range(1, total + 1), min(total, n * 4))
+        foods = con.execute(
+            "SELECT name, short_name FROM foods WHERE rowid IN "
+            "(SELECT value FROM json_each(?))",
+            (json.dumps(sample),),
+        ).fetchall()
+        aliases = [
+            r[0]
+            for r in con.execute(
+                """SELECT a.alias FROM alias AS a JOIN foods AS f ON f.id = a.food_id
+                WHERE f.rowid IN (SELECT value FROM json_each(?))
+                  AND a.alias != lower(f.name) AND a.alias != f.short_name""",
+                (json.dumps(sample),),
+            )
+        ]
+        cjk = [
+            r[0]
+            for r in con.execute(
+                "SELECT alias FROM alias WHERE alias >= '一' ORDER BY random() LIMIT ?",
+                (n * 4,),
+            )
+        ]
+    finally:
+        con.close()
+    rng.shuffle(foods)
+    latin = [a for a in aliases if not CJK_RE.search(a)] or [s for _, s in foods]
+
+    def fragment(name):
+        words = [w for w in re.findall(r"[a-z]+", name.lower()) if len(w) >= 3]
+        w = rng.choice(words) if words else name.lower()
+        size = rng.randint(3, min(6, len(w))) if len(w) >= 3 else len(w)
+        start = rng.randint(0, len(w) - size)
+        return w[start : start + size]
+
+    def cjk_piece(alias):
+        if len(alias) > 3 and rng.random() < 0.5:
+            size = rng.randint(2, 3)
+            start = rng.randint(0, len(alias) - size)
+            return alias[start : start + size]
+        return alias
+
+    out = {
+        "exact": [name for name, _ in foods[:n]],
+        "alias": [rng.choice(latin) for _ in range(n)],
+        "substring": [fragment(name) for name, _ in foods[:n]],
+        "typo": [typo(short or name.lower(), rng) for name, short in foods[:n]],
+        "cjk": [cjk_piece(rng.choice(cjk)) for _ in range(n)] if cjk else [],
+    }
+    kinds = [k for k in MIX if out[k]]
+    picks = rng.choices(kinds, [MIX[k] for k in kinds], k=n)
+    out["mixed"] = [rng.choice(out[k]) for k in picks]
+    return out
+
+
+def ranked_stage(engine: SearchEngine, q: str, limit: int):
+    """rank() as (strongest source of the top hit, hits), like resolve()."""
+    hits = engine.rank(q, limit)
+    if not hits:
+        return None, hits
+    return max(hits[0].sources, key=RANK_WEIGHTS.get), hits
+
+
+def run_workload(
+    engine: SearchEngine, queries: Sequence[str], limit: int, mode: str = "staged"
+) -> dict:
+    run = engine.resolve if mode == "staged" else partial(ranked_stage, engine)
+    for q in queries[:20]:
+        run(q, limit)
+    samples, stages = [], Counter()
+    t0 = time.perf_counter()
+    for q in queries:
+        t1 = time.perf_counter()
+        stage, _ = run(q, limit)
+        samples.append((time.perf_counter() - t1) * 1000)
+        stages[stage or "none"] += 1
+    seconds = time.perf_counter() - t0
+    return {
+        "queries": len(queries),
+        **summarize(samples, p95=True),
+        "qps": len(queries) / seconds,
+        "hit_rate": 1 - stages["none"] / len(queries),
+        "stages": dict(stages.most_common()),
+    }
+
+
+def run_size(
+    rows: int,
+    queries: int,
+    limit: int,
+    rebuild: bool,
+    seed: int,
+    kinds=None,
+    modes=("staged",),
+) -> dict:
+    """
+    Every workload under each mode; staged results are keyed by workload,
+    others by "workload/mode" (e.g. "typo/ranked").
+    """
+    db, build_s = catalog(rows, rebuild)
+    con = sqlite3.connect(db)
+    try:
+        aliases = con.execute("SELECT count(*) FROM alias").fetchone()[0]
+    finally:
+        con.close()
+    result = {
+        "rows": rows,
+        "aliases": aliases,
+        "db_mib": db.stat().st_size / 2**20,
+        "build_s": build_s,
+        "workloads": {},
+    }
+    with SearchEngine(db, cache_size=0) as engine:
+        for kind, qs in workloads(db, queries, seed).items():
+            if not qs or (kinds is not None and kind not in kinds):
+                continue
+            for mode in modes:
+                name = kind if mode == "staged" else f"{kind}/{mode}"
+                result["workloads"][name] = run_workload(engine, qs, limit, mode)
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def report(run: dict) -> None:
+    print(
+        f"\n=== {run['rows']:,} rows · {run['aliases']:,} aliases · "
+        f"{run['db_mib']:.0f} MiB ==="
+    )
+    for kind, r in run["workloads"].items():
+        top = ", ".join(f"{s} {n}" for s, n in list(r["stages"].items())[:3])
+        print(
+            f"{kind:>16}  p50={r['p50_ms']:.3f}  p95={r['p95_ms']:.3f}  "
+            f"p99={r['p99_ms']:.3f}  qps={r['qps']:,.0f}  "
+            f"hit={r['hit_rate']:.3f}  [{top}]"
+        )
+
+
+def compare(old_path: Path, new_path: Path) -> None:
+    """p50 / p99 of `new` relative to `old` for every (rows, workload) in both."""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = {r["rows"]: r for r in json.load(f)["runs"]}
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = {r["rows"]: r for r in json.load(f)["runs"]}
+    for rows in sorted(old.keys() & new.keys()):
+        print(f"\n=== {rows:,} rows: {old_path.name} -> {new_path.name} ===")
+        for kind, b in new[rows]["workloads"].items():
+            a = old[rows]["workloads"].get(kind)
+            if a is None:
+                continue
+            cells = "  ".join(
+                f"{m}={a[m]:.3f}->{b[m]:.3f} ({b[m] / a[m] - 1:+.0%})"
+                for m in ("p50_ms", "p99_ms")
+                if a[m] > 0
+            )
+            print(f"{kind:>10}  {cells}")
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 5_000_000]
+    )
+    parser.add_argument("--queries", type=int, default=1000, help="per workload")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workloads",
+        nargs="+",
+        choices=[*MIX, "mixed"],
+        help="subset to run (default: all)",
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=["staged", "ranked"],
+        default=["staged"],
+        help="staged: resolve() stage by stage; ranked: one rank() statement",
+    )
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument(
+        "--out", type=Path, help="results JSON (default: data/bench/results/)"
+    )
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    started = datetime.now(timezone.utc)
+    runs = []
+    for rows in args.rows:
+        runs.append(
+            run_size(
+                rows,
+                args.queries,
+                args.limit,
+                args.rebuild,
+                args.seed,
+                args.workloads,
+                args.modes,
+            )
+        )
+        report(runs[-1])
+
+    out = args.out or RESULTS_DIR / f"suite-{started:%Y%m%dT%H%M%SZ}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "meta": {
+                    "started_at": started.isoformat(timespec="seconds"),
+                    "commit": git_commit(),
+                    "python": platform.python_version(),
+                    "sqlite": sqlite3.sqlite_version,
+                    "platform": platform.platform(),
+                    "cpus": os.cpu_count(),
+                    "argv": sys.argv[1:],
+                    "queries": args.queries,
+                    "limit": args.limit,
+                    "seed": args.seed,
+                    "workloads": args.workloads,
+                    "modes": args.modes,
+                    "mix": MIX,
+                },
+                "runs": runs,
+            },
+            f,
+            indent=2,
+            ensure_ascii=False,
+        )
+    print(f"\n📝 Results -> {out}")
+
+
+if __name__ == "__main__":
+    main()
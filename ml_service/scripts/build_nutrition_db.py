@@ -1,6 +1,14 @@
-import json, sqlite3, re
+import json, os, sqlite3, re, uuid
+from datetime import datetime, timezone
 from pathlib import Path
 
+from food_text import cjk_tokens, deletes, has_cjk, normalize_key
+from health_tags import classify_batch
+from name_match import build_sidecar
+from nutrient_store import export_columns
+from similar_foods import export_profiles
+from search_food import RULES, SUGGEST_MAX_LEN, TOKEN_RE
+
 ROOT = Path(__file__).resolve().parents[1]
 BUILD = ROOT / "data" / "build"
 CUR = ROOT / "data" / "curated"
@@ -197,12 +205,12 @@ def prepare_curated_entry(item: dict, source: str, id_prefix: str | None = None)
     return row, alias_rows
 
 
-def main():
-    DB.parent.mkdir(parents=True, exist_ok=True)
-    con = sqlite3.connect(DB)
-    cur = con.cursor()
-
+def create_schema(cur):
     cur.executescript("""
+    -- build_id 在索引重建完成后才写入；构建期间为空，搜索端不会缓存
+    CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT);
+    DELETE FROM meta WHERE key = 'build_id';
+
     DROP TABLE IF EXISTS foods;
     CREATE TABLE foods(
       id TEXT PRIMARY KEY,
@@ -214,14 +222,26 @@ def main():
       food_groups TEXT,
       energy_kcal REAL, protein_g REAL, fat_g REAL, sat_fat_g REAL,
       carb_g REAL, sugar_g REAL, fiber_g REAL, sodium_mg REAL,
-      source TEXT
+      source TEXT,
+      tag_mask INTEGER,
+      unknown_mask INTEGER
     );
     CREATE INDEX IF NOT EXISTS idx_foods_short ON foods(short_name);
     CREATE INDEX IF NOT EXISTS idx_foods_name ON foods(name);
+    CREATE INDEX IF NOT EXISTS idx_foods_tags ON foods(tag_mask);
 
     DROP TABLE IF EXISTS alias;
     CREATE TABLE alias(alias TEXT PRIMARY KEY, food_id TEXT REFERENCES foods(id));
 
+    -- normalize_key() 之后的别名 / 名称；rank 0 = 别名，1 = name / short_name
+    DROP TABLE IF EXISTS alias_norm;
+    CREATE TABLE alias_norm(
+      key TEXT NOT NULL,
+      food_id TEXT NOT NULL REFERENCES foods(id),
+      rank INTEGER NOT NULL,
+      PRIMARY KEY (key, food_id)
+    ) WITHOUT ROWID;
+
     DROP TABLE IF EXISTS foods_fts;
     CREATE VIRTUAL TABLE foods_fts
     USING fts5(
@@ -230,8 +250,260 @@ def main():
       content='',
       tokenize = 'unicode61 remove_diacritics 2'
     );
+
+    DROP TABLE IF EXISTS foods_trgm;
+    CREATE VIRTUAL TABLE foods_trgm
+    USING fts5(
+      name,
+      short_name,
+      aliases,
+      content='',
+      tokenize = 'trigram'
+    );
+
+    -- 中文别名：unicode61 不切分 CJK，这里存预先切好的单字 + 双字 token
+    DROP TABLE IF EXISTS foods_cjk;
+    CREATE VIRTUAL TABLE foods_cjk
+    USING fts5(
+      tokens,
+      content='',
+      tokenize = 'unicode61'
+    );
+
+    -- 拼写纠错：别名 / 短名里每个词的删除变体 -> 词，len 供按长度过滤
+    DROP TABLE IF EXISTS fuzzy_deletes;
+    DROP TABLE IF EXISTS fuzzy_words;
+    CREATE TABLE fuzzy_words(
+      variant TEXT NOT NULL,
+      len INTEGER NOT NULL,
+      word TEXT NOT NULL,
+      PRIMARY KEY (variant, len, word)
+    ) WITHOUT ROWID;
+
+    DROP TABLE IF EXISTS suggest_vocab;
+    CREATE TABLE suggest_vocab(
+      term TEXT PRIMARY KEY,
+      len INTEGER NOT NULL,
+      popularity INTEGER NOT NULL
+    ) WITHOUT ROWID;
+
+    -- "did you mean"：建议词表中整词的删除变体 -> 词；带上长度与热度，
+    -- 查询时不回表就能先按距离下界 / 长度差 / 热度排序再截断
+    DROP TABLE IF EXISTS suggest_deletes;
+    CREATE TABLE suggest_deletes(
+      variant TEXT NOT NULL,
+      len INTEGER NOT NULL,
+      term TEXT NOT NULL,
+      popularity INTEGER NOT NULL,
+      PRIMARY KEY (variant, len, term)
+    ) WITHOUT ROWID;
     """)
 
+
+def tag_foods(cur, rules: dict | None = None):
+    """
+    Store classify()'s tags per food as tag_mask / unknown_mask bitmasks
+    (bit layout in search_food.TAG_BITS / UNKNOWN_BITS) so searches can
+    filter on them inside SQL.
+    """
+    rules = rules or RULES
+    fields = ("sugar_g", "fat_g", "fiber_g", "sodium_mg")
+    rows = cur.execute(f"SELECT rowid, {', '.join(fields)} FROM foods").fetchall()
+    if rows:
+        rowids, *values = zip(*rows)
+        tags, unknown = classify_batch(dict(zip(fields, values)), rules)
+        cur.executemany(
+            "UPDATE foods SET tag_mask = ?, unknown_mask = ? WHERE rowid = ?",
+            zip(tags.tolist(), unknown.tolist(), rowids),
+        )
+    cur.execute(
+        "INSERT OR REPLACE INTO meta(key, value) VALUES('tag_rules', ?)",
+        (json.dumps(rules),),
+    )
+
+
+def rebuild_search_indexes(cur):
+    """
+    Recompute everything derived from the current foods and alias rows:
+    health-tag masks, the full-text indexes (foods_fts for token queries,
+    foods_trgm for substring fragments, foods_cjk for Chinese text), the
+    normalized alias keys, the fuzzy word deletion dictionary and the
+    "did you mean" vocabulary.
+    """
+    tag_foods(cur)
+    cur.executescript(
+        """
+        DROP TABLE IF EXISTS temp.food_aliases;
+        CREATE TEMP TABLE food_aliases AS
+        SELECT food_id, GROUP_CONCAT(alias, ' ') AS aliases
+        FROM alias
+        GROUP BY food_id;
+        CREATE INDEX temp.idx_food_aliases ON food_aliases(food_id);
+
+        DELETE FROM foods_fts;
+        INSERT INTO foods_fts(rowid, name, aliases)
+        SELECT f.rowid,
+               f.name,
+               TRIM(COALESCE(a.aliases, ''))
+        FROM foods AS f
+        LEFT JOIN temp.food_aliases AS a
+        ON a.food_id = f.id;
+
+        DELETE FROM foods_trgm;
+        INSERT INTO foods_trgm(rowid, name, short_name, aliases)
+        SELECT f.rowid,
+               f.name,
+               COALESCE(f.short_name, ''),
+               TRIM(COALESCE(a.aliases, ''))
+        FROM foods AS f
+        LEFT JOIN temp.food_aliases AS a
+        ON a.food_id = f.id;
+        """
+    )
+    rebuild_cjk_index(cur)
+    cur.execute("DROP TABLE temp.food_aliases")
+    rebuild_norm_index(cur)
+    rebuild_fuzzy_index(cur)
+    rebuild_suggest_index(cur)
+    stamp_build(cur)
+
+
+def stamp_build(cur):
+    """
+    Record a fresh build id. Search engines key their result caches on it,
+    so any rebuild invalidates every cached result.
+    """
+    cur.executemany(
+        "INSERT OR REPLACE INTO meta(key, value) VALUES(?,?)",
+        [
+            ("build_id", uuid.uuid4().hex),
+            ("built_at", datetime.now(timezone.utc).isoformat(timespec="seconds")),
+        ],
+    )
+
+
+def rebuild_cjk_index(cur):
+    """Unigram + bigram tokens of the CJK parts of each name and its aliases."""
+    cur.execute("DELETE FROM foods_cjk")
+    rows = cur.execute(
+        """SELECT f.rowid, f.name || ' ' || COALESCE(a.aliases, '')
+        FROM foods AS f
+        LEFT JOIN temp.food_aliases AS a ON a.food_id = f.id"""
+    ).fetchall()
+    cur.executemany(
+        "INSERT INTO foods_cjk(rowid, tokens) VALUES(?,?)",
+        ((rowid, " ".join(cjk_tokens(text))) for rowid, text in rows if has_cjk(text)),
+    )
+
+
+def rebuild_norm_index(cur):
+    """
+    normalize_key() of every alias, name and short_name, so messy input
+    ("Roti-Canai", "rotis canai") resolves with one primary-key probe.
+    """
+    cur.execute("DELETE FROM alias_norm")
+    sources = (
+        ("SELECT alias, food_id FROM alias", 0),
+        ("SELECT name, id FROM foods", 1),
+        ("SELECT short_name, id FROM foods WHERE short_name IS NOT NULL", 1),
+    )
+    ranks = {}
+    for query, rank in sources:
+        for text, food_id in cur.execute(query).fetchall():
+            key = normalize_key(text)
+            if key and ranks.get((key, food_id), rank) >= rank:
+                ranks[(key, food_id)] = rank
+    cur.executemany(
+        "INSERT INTO alias_norm(key, food_id, rank) VALUES(?,?,?)",
+        ((key, food_id, rank) for (key, food_id), rank in ranks.items()),
+    )
+
+
+def rebuild_fuzzy_index(cur):
+    """
+    SymSpell deletion dictionary over the words of alias keys and short
+    names: every delete-variant maps back to the words that produce it.
+    Words rather than whole terms keep the table proportional to the
+    vocabulary, and a misspelt word only meets the handful of known words
+    near it, however many terms share its brand or dish name.
+    """
+    cur.execute("DELETE FROM fuzzy_words")
+    words = {
+        word
+        for r in cur.execute(
+            """SELECT alias FROM alias
+            UNION SELECT short_name FROM foods WHERE short_name IS NOT NULL"""
+        )
+        if r[0]
+        for word in r[0].split()
+    }
+    cur.executemany(
+        "INSERT OR IGNORE INTO fuzzy_words(variant, len, word) VALUES(?,?,?)",
+        ((variant, len(word), word) for word in words for variant in deletes(word)),
+    )
+
+
+def rebuild_suggest_index(cur):
+    """
+    "Did you mean" vocabulary: every alias and short name of at most
+    SUGGEST_MAX_LEN characters with its length and a popularity score,
+    the number of foods it names directly plus the smallest foods_fts
+    document frequency of its tokens, plus the SymSpell deletion
+    dictionary of those terms (suggest_deletes) to find candidates.
+    """
+    cur.execute("DELETE FROM suggest_vocab")
+    cur.execute("DELETE FROM suggest_deletes")
+    cur.execute(
+        "CREATE VIRTUAL TABLE temp.fts_vocab USING fts5vocab(main, foods_fts, row)"
+    )
+    df = dict(cur.execute("SELECT term, doc FROM temp.fts_vocab").fetchall())
+    cur.execute("DROP TABLE temp.fts_vocab")
+    rows = cur.execute(
+        """SELECT term, COUNT(DISTINCT food_id) FROM (
+            SELECT alias AS term, food_id FROM alias
+            UNION ALL
+            SELECT short_name, id FROM foods WHERE short_name IS NOT NULL
+        )
+        WHERE length(term) BETWEEN 1 AND ?
+        GROUP BY term""",
+        (SUGGEST_MAX_LEN,),
+    ).fetchall()
+
+    def popularity(term, direct):
+        tokens = TOKEN_RE.findall(term)
+        return direct + min((df.get(t, 0) for t in tokens), default=0)
+
+    vocab = [(term, len(term), popularity(term, n)) for term, n in rows]
+    cur.executemany(
+        "INSERT INTO suggest_vocab(term, len, popularity) VALUES(?,?,?)", vocab
+    )
+    cur.executemany(
+        """INSERT OR IGNORE INTO suggest_deletes(variant, len, term, popularity)
+        VALUES(?,?,?,?)""",
+        (
+            (variant, n, term, pop)
+            for term, n, pop in vocab
+            for variant in deletes(term)
+        ),
+    )
+
+
+def build_path(path: Path) -> Path:
+    """Temp file next to `path` that a build writes before os.replace()."""
+    return path.with_name(f".{path.name}.building")
+
+
+def main():
+    DB.parent.mkdir(parents=True, exist_ok=True)
+    # 在临时文件里构建，完成后 os.replace：serving 模式以 immutable 打开数据库，
+    # 原地改写会让它读到半成品；替换后它按 inode 变化重新打开新文件
+    tmp = build_path(DB)
+    tmp.unlink(missing_ok=True)
+    con = sqlite3.connect(tmp)
+    cur = con.cursor()
+
+    create_schema(cur)
+
     # 1) USDA
     # usda_path = BUILD / "foods.usda.json"
     # with open(usda_path, "r", encoding="utf-8") as f:
@@ -410,26 +682,14 @@ def main():
             )
             print(f"🔗 Inserted MyFCD aliases: {len(alias_rows)} rows")
 
-    # Rebuild FTS index with current foods and aliases
-    cur.execute("DELETE FROM foods_fts;")
-    cur.execute(
-        """
-        INSERT INTO foods_fts(rowid, name, aliases)
-        SELECT f.rowid,
-               f.name,
-               TRIM(COALESCE(a.aliases, ''))
-        FROM foods AS f
-        LEFT JOIN (
-            SELECT food_id, GROUP_CONCAT(alias, ' ') AS aliases
-            FROM alias
-            GROUP BY food_id
-        ) AS a
-        ON a.food_id = f.id;
-        """
-    )
+    rebuild_search_indexes(cur)
 
     con.commit()
     con.close()
+    os.replace(tmp, DB)
+    print(f"🔤 Name matcher -> {build_sidecar(DB).name}")
+    print(f"🧮 Nutrient columns -> {export_columns(DB).name}/")
+    print(f"🧭 Similar-food profiles -> {export_profiles(DB).name}")
     print(f"📦 Done -> {DB}")
 
 
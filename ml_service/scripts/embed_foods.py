@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""Offline sentence embeddings of nutrition.db foods and semantic search over them.
+
+python embed_foods.py build [--ivf-lists 256]
+python embed_foods.py query "iced milk tea" "fried noodles"
+python embed_foods.py bench --queries 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from search_food import DB, atomic_write, read_build_id
+
+MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # 384 维，CPU 上足够快
+BATCH_SIZE = 64
+MAX_TOKENS = 64
+# exact 检索时每次从 mmap 读入并转换为 float32 的行数
+SCAN_ROWS = 1 << 16
+DEFAULT_NPROBE = 8
+
+SQL_FOOD_TEXTS = """
+    SELECT f.id, f.name, f.short_name, GROUP_CONCAT(a.alias, '; ')
+    FROM foods AS f
+    LEFT JOIN alias AS a ON a.food_id = f.id
+    GROUP BY f.rowid
+    ORDER BY f.rowid"""
+
+
+def embedding_paths(db_path=DB) -> Tuple[Path, Path, Path]:
+    """(float16 matrix .npy, ids/metadata .json, optional IVF .npz)."""
+    db_path = Path(db_path)
+    return (
+        db_path.with_suffix(".embeddings.npy"),
+        db_path.with_suffix(".embeddings.json"),
+        db_path.with_suffix(".embeddings.ivf.npz"),
+    )
+
+
+def food_text(name: str, short_name: str | None, aliases: str | None) -> str:
+    parts = [name]
+    if short_name and short_name != name.lower():
+        parts.append(short_name)
+    if aliases:
+        parts.append(aliases)
+    return "; ".join(parts)
+
+
+class Encoder:
+    """Mean-pooled, L2-normalized sentence embeddings on CPU via transformers."""
+
+    def __init__(self, model: str = MODEL, batch_size: int = BATCH_SIZE):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self._torch = torch
+        self.model_name = model
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+        self.model = AutoModel.from_pretrained(model).eval()
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        torch = self._torch
+        out = []
+        with torch.inference_mode():
+            for i in range(0, len(texts), self.batch_size):
+                batch = self.tokenizer(
+                    list(texts[i : i + self.batch_size]),
+                    padding=True,
+                    truncation=True,
+                    max_length=MAX_TOKENS,
+                    return_tensors="pt",
+                )
+                hidden = self.model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+                pooled = torch.nn.functional.normalize(pooled, dim=1)
+                out.append(pooled.numpy().astype(np.float32))
+        if not out:
+            return np.empty((0, self.model.config.hidden_size), dtype=np.float32)
+        return np.concatenate(out)
+
+
+def train_ivf(
+    vectors: np.ndarray, n_lists: int, iters: int = 10, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means; returns (unit centroids, list id per vector)."""
+    rng = np.random.default_rng(seed)
+    n_lists = min(n_lists, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.empty(len(vectors), dtype=np.int64)
+        for i in range(0, len(vectors), SCAN_ROWS):
+            assign[i : i + SCAN_ROWS] = np.argmax(
+                vectors[i : i + SCAN_ROWS] @ centroids.T, axis=1
+            )
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # 空簇保留原中心
+        centroids = np.where(empty[:, None], centroids, sums / np.maximum(norms, 1e-12))
+    return centroids.astype(np.float32), assign
+
+
+def build_embeddings(
+    db_path=DB, model: str = MODEL, n_lists: int = 0, encoder: Encoder | None = None
+) -> Path:
+    """
+    Encode every food and write the float16 matrix next to `db_path`.
+    With n_lists > 0 the rows are also clustered (IVF) and stored grouped
+    by list, so each list is one contiguous slice of the memory map.
+    """
+    con = sqlite3.connect(db_path)
+    try:
+        build_id = read_build_id(con)
+        foods = con.execute(SQL_FOOD_TEXTS).fetchall()
+    finally:
+        con.close()
+    ids = [food_id for food_id, *_ in foods]
+    texts = [food_text(*rest) for _, *rest in foods]
+
+    encoder = encoder or Encoder(model)
+    vectors = encoder.encode(texts)
+    matrix_path, meta_path, ivf_path = embedding_paths(db_path)
+    n_ivf = 0
+    if n_lists > 0 and len(vectors):
+        centroids, assign = train_ivf(vectors, n_lists)
+        order = np.argsort(assign, kind="stable")
+        vectors = vectors[order]
+        ids = [ids[i] for i in order]
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(centroids)), out=offsets[1:])
+        with atomic_write(ivf_path) as f:
+            np.savez(f, centroids=centroids, offsets=offsets)
+        n_ivf = len(centroids)
+
+    # 临时文件 + os.replace，已 mmap 旧矩阵的进程不受影响；
+    # json 最后替换，SemanticIndex 以它的 build_id / 行数判断整套文件是否一致
+    with atomic_write(matrix_path) as f:
+        np.save(f, vectors.astype(np.float16))
+    with atomic_write(meta_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "model": encoder.model_name,
+                "build_id": build_id,
+                "dim": int(vectors.shape[1]),
+                "ivf_lists": n_ivf,
+                "ids": ids,
+            },
+            f,
+            ensure_ascii=False,
+        )
+    if not n_ivf:
+        ivf_path.unlink(missing_ok=True)
+    return matrix_path
+
+
+class SemanticIndex:
+    """
+    Read-only view over the embedding files. The matrix is opened with
+    mmap_mode="r", so processes share the page cache instead of each
+    holding a copy; exact search scans it in SCAN_ROWS chunks and IVF
+    search only touches the `nprobe` closest lists.
+    """
+
+    def __init__(self, db_path=DB, encoder: Encoder | None = None):
+        matrix_path, meta_path, ivf_path = embedding_paths(db_path)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        con = sqlite3.connect(db_path)
+        try:
+            build_id = read_build_id(con)
+        finally:
+            con.close()
+        # 与 load_matcher 一样以 build_id 判断是否过期；过期的矩阵不打开
+        if build_id is not None and meta["build_id"] != build_id:
+            raise ValueError(
+                f"embeddings are from build {meta['build_id']}, "
+                f"database is {build_id}; run `embed_foods.py build`"
+            )
+        self.model_name = meta["model"]
+        self.build_id = meta["build_id"]
+        self.ids: List[str] = meta["ids"]
+        self.matrix = np.load(matrix_path, mmap_mode="r")
+        if len(self.matrix) != len(self.ids):
+            raise ValueError(f"{matrix_path.name} does not match {meta_path.name}")
+        self.centroids = self.offsets = None
+        if meta.get("ivf_lists", 1) and ivf_path.exists():
+            with np.load(ivf_path) as z:
+                self.centroids, self.offsets = z["centroids"], z["offsets"]
+        self._encoder = encoder
+        self._encoder_lock = threading.Lock()
+
+    @property
+    def encoder(self) -> Encoder:
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    self._encoder = Encoder(self.model_name)
+        return self._encoder
+
+    def _exact(self, qv: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_s = np.full((len(qv), 0), -np.inf, dtype=np.float32)
+        best_i = np.empty((len(qv), 0), dtype=np.int64)
+        for start in range(0, len(self.ids), SCAN_ROWS):
+            chunk = np.asarray(self.matrix[start : start + SCAN_ROWS], dtype=np.float32)
+            rows = np.arange(start, start + len(chunk))
+            s = np.concatenate([best_s, qv @ chunk.T], axis=1)
+            i = np.concatenate(
+                [best_i, np.broadcast_to(rows, (len(qv), len(chunk)))], axis=1
+            )
+            keep = np.argpartition(-s, min(k, s.shape[1]) - 1, axis=1)[:, :k]
+            best_s = np.take_along_axis(s, keep, axis=1)
+            best_i = np.take_along_axis(i, keep, axis=1)
+        return best_s, best_i
+
+    def _ivf(self, qv: np.ndarray, k: int, nprobe: int):
+        nprobe = min(nprobe, len(self.centroids))
+        near = -(qv @ self.centroids.T)
+        lists = np.argpartition(near, nprobe - 1, axis=1)[:, :nprobe]
+        scores, rows = [], []
+        for q, probe in zip(qv, lists):
+            idx = np.concatenate(
+                [np.arange(self.offsets[p], self.offsets[p + 1]) for p in probe]
+            )
+            s = np.asarray(self.matrix[idx], dtype=np.float32) @ q
+            top = np.argpartition(-s, min(k, len(s)) - 1)[:k] if len(s) else idx[:0]
+            scores.append(s[top])
+            rows.append(idx[top])
+        width = max((len(s) for s in scores), default=0)
+        pad_s = np.full((len(qv), width), -np.inf, dtype=np.float32)
+        pad_i = np.zeros((len(qv), width), dtype=np.int64)
+        for r, (s, i) in enumerate(zip(scores, rows)):
+            pad_s[r, : len(s)], pad_i[r, : len(i)] = s, i
+        return pad_s, pad_i
+
+    def search_vectors(
+        self, qv: np.ndarray, k: int = 5, nprobe: int | None = DEFAULT_NPROBE
+    ) -> List[List[Tuple[str, float]]]:
+        """Top-k (food_id, cosine) per query vector; nprobe=None forces exact."""
+        if not len(self.ids) or k <= 0:
+            return [[] for _ in qv]
+        qv = np.asarray(qv, dtype=np.float32)
+        if self.centroids is not None and nprobe:
+            scores, rows = self._ivf(qv, k, nprobe)
+        else:
+            scores, rows = self._exact(qv, k)
+        order = np.argsort(-scores, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        rows = np.take_along_axis(rows, order, axis=1)
+        return [
+            [(self.ids[i], float(s)) for i, s in zip(r, sc) if np.isfinite(s)]
+            for r, sc in zip(rows.tolist(), scores.tolist())
+        ]
+
+    def search_many(
+        self, queries: Sequence[str], k: int = 5, nprobe: int | None = DEFAULT_NPROBE
+    ) -> List[List[Tuple[str, float]]]:
+        """Encode all queries in one batched forward pass, then search."""
+        return self.search_vectors(self.encoder.encode(list(queries)), k, nprobe)
+
+    def search(
+        self, query: str, k: int = 5, nprobe: int | None = DEFAULT_NPROBE
+    ) -> List[Tuple[str, float]]:
+        return self.search_many([query], k, nprobe)[0]
+
+
+def load_index(db_path=DB, encoder: Encoder | None = None) -> SemanticIndex:
+    """
+    Open the embeddings, re-encoding the catalog (same model and IVF list
+    count) when they are missing or from an older build.
+    """
+    _, meta_path, _ = embedding_paths(db_path)
+    model, n_lists = MODEL, 0
+    if meta_path.exists():
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        model, n_lists = meta["model"], meta.get("ivf_lists", 0)
+        try:
+            return SemanticIndex(db_path, encoder)
+        except ValueError:
+            pass
+    build_embeddings(db_path, model, n_lists, encoder)
+    return SemanticIndex(db_path, encoder)
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def default_index() -> SemanticIndex:
+    global _default_index
+    if _default_index is None:
+        with _default_index_lock:
+            if _default_index is None:
+                _default_index = load_index()
+    return _default_index
+
+
+def semantic_search(query: str, k: int = 5) -> List[Tuple[str, float]]:
+    return default_index().search(query, k)
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def bench(index: SemanticIndex, queries: Sequence[str], k: int) -> dict:
+    """
+    p50/p99 of single-query latency (encode + search), the same split into
+    the encoder forward pass and the index lookup, and batched q/s.
+    """
+    results = {}
+    for name, nprobe in (("exact", None), ("ivf", DEFAULT_NPROBE)):
+        if nprobe and index.centroids is None:
+            continue
+        for q in queries[:10]:
+            index.search(q, k, nprobe)
+        total, encode, search = [], [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            qv = index.encoder.encode([q])
+            t1 = time.perf_counter()
+            index.search_vectors(qv, k, nprobe)
+            t2 = time.perf_counter()
+            total.append((t2 - t0) * 1000)
+            encode.append((t1 - t0) * 1000)
+            search.append((t2 - t1) * 1000)
+        t0 = time.perf_counter()
+        index.search_many(queries, k, nprobe)
+        results[name] = {
+            "p50_ms": statistics.median(total),
+            "p99_ms": percentile(total, 0.99),
+            "encode_p50_ms": statistics.median(encode),
+            "encode_p99_ms": percentile(encode, 0.99),
+            "search_p50_ms": statistics.median(search),
+            "search_p99_ms": percentile(search, 0.99),
+            "batch_qps": len(queries) / (time.perf_counter() - t0),
+        }
+    return results
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", type=Path, default=DB)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="encode every food")
+    p_build.add_argument("--model", default=MODEL)
+    p_build.add_argument("--ivf-lists", type=int, default=0)
+    p_query = sub.add_parser("query")
+    p_query.add_argument("texts", nargs="+")
+    p_query.add_argument("-k", type=int, default=5)
+    p_bench = sub.add_parser("bench", help="p50/p99 latency on CPU")
+    p_bench.add_argument("--queries", type=int, default=200)
+    p_bench.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        t0 = time.perf_counter()
+        path = build_embeddings(args.db, args.model, args.ivf_lists)
+        print(f"🧠 Wrote {path.name} in {time.perf_counter() - t0:.1f}s")
+        return
+
+    index = load_index(args.db)
+    if args.cmd == "query":
+        for text, hits in zip(args.texts, index.search_many(args.texts, args.k)):
+            print(f"\n=== {text!r} ===")
+            for food_id, score in hits:
+                print(f"  {score:.3f}  {food_id}")
+        return
+
+    con = sqlite3.connect(args.db)
+    try:
+        names = [
+            r[0]
+            for r in con.execute(
+                "SELECT name FROM foods ORDER BY random() LIMIT ?", (args.queries,)
+            )
+        ]
+    finally:
+        con.close()
+    for name, stats in bench(index, names, args.k).items():
+        cells = "  ".join(f"{k}={v:.3f}" for k, v in stats.items())
+        print(f"{name:>6}  {cells}")
+
+
+if __name__ == "__main__":
+    main()
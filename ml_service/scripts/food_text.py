@@ -0,0 +1,151 @@
+"""Text helpers shared by the nutrition DB build and the search scripts."""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import Counter
+from typing import List, Set
+
+# SymSpell 参数：最大编辑距离与参与删除变体的前缀长度
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+# CJK 统一表意文字（基本区、扩展 A、兼容区）的连续片段
+CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+WORD_RE = re.compile(r"\w")
+# 非字母数字（含下划线）一律视作分隔符
+SEPARATOR_RE = re.compile(r"[\W_]+")
+
+
+def deletes(term: str, max_distance: int = MAX_EDIT_DISTANCE) -> Set[str]:
+    """
+    All strings reachable from `term[:PREFIX_LENGTH]` by deleting up to
+    `max_distance` characters, including the prefix itself. Two terms within
+    the edit distance always share at least one variant (SymSpell).
+    """
+    head = term[:PREFIX_LENGTH]
+    out = {head}
+    frontier = {head}
+    for _ in range(max_distance):
+        nxt = set()
+        for word in frontier:
+            if len(word) <= 1:
+                continue
+            for i in range(len(word)):
+                nxt.add(word[:i] + word[i + 1 :])
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+def edit_distance(a: str, b: str, max_distance: int = MAX_EDIT_DISTANCE) -> int:
+    """
+    Optimal string alignment distance (adjacent swaps count as one edit).
+    Returns max_distance + 1 as soon as the bound is exceeded.
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    # 只算 |i - j| <= max_distance 的对角带，带外的格子必然超出上界
+    big = max_distance + 1
+    n = len(b)
+    prev2 = None
+    prev = [j if j <= max_distance else big for j in range(n + 1)]
+    for i in range(1, len(a) + 1):
+        lo = max(1, i - max_distance)
+        hi = min(n, i + max_distance)
+        cur = [big] * (n + 1)
+        if i <= max_distance:
+            cur[0] = i
+        ai = a[i - 1]
+        for j in range(lo, hi + 1):
+            d = prev[j - 1] if ai == b[j - 1] else prev[j - 1] + 1
+            if prev[j] + 1 < d:
+                d = prev[j] + 1
+            if cur[j - 1] + 1 < d:
+                d = cur[j - 1] + 1
+            if (
+                prev2 is not None
+                and j > 1
+                and ai == b[j - 2]
+                and a[i - 2] == b[j - 1]
+                and prev2[j - 2] + 1 < d
+            ):
+                d = prev2[j - 2] + 1
+            cur[j] = d
+        if min(cur[lo - 1 : hi + 1]) > max_distance:
+            return big
+        prev2, prev = prev, cur
+    return min(prev[-1], big)
+
+
+def bag_distance(a: str, b: str) -> int:
+    """
+    Lower bound of edit_distance() from character counts alone: each edit
+    changes at most one character on either side.
+    """
+    ca, cb = Counter(a), Counter(b)
+    return max(sum((ca - cb).values()), sum((cb - ca).values()))
+
+
+def has_cjk(text: str) -> bool:
+    return CJK_RE.search(text) is not None
+
+
+def is_cjk(text: str) -> bool:
+    """True when text has CJK and every other word character is absent."""
+    return has_cjk(text) and not WORD_RE.search(CJK_RE.sub("", text))
+
+
+def cjk_tokens(text: str) -> List[str]:
+    """
+    Index tokens for the CJK runs of `text`: every character plus every
+    adjacent pair, e.g. "白饭" -> ["白", "饭", "白饭"]. Anything outside
+    the CJK runs is left to the other indexes.
+    """
+    out = []
+    for run in CJK_RE.findall(text):
+        out.extend(run)
+        out.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return out
+
+
+def cjk_query(text: str):
+    """
+    FTS5 MATCH expression over cjk_tokens: a one-character run matches its
+    unigram, longer runs AND all of their bigrams. None without CJK.
+    """
+    terms = []
+    for run in CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return " ".join(f'"{t}"' for t in dict.fromkeys(terms)) or None
+
+
+def _singular(token: str) -> str:
+    # 只处理常见英文复数；两端同样折叠，偶尔误伤（pedas -> peda）也不影响匹配
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "xes", "zes", "sses")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us")):
+        return token[:-1]
+    return token
+
+
+def normalize_key(text: str) -> str:
+    """
+    Canonical lookup key for alias matching: NFKC, casefold, diacritics
+    stripped, punctuation and whitespace collapsed to single spaces and
+    simple English plurals folded ("Rotis-Canai" -> "roti canai").
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(
+        c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c)
+    )
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(_singular(t) for t in SEPARATOR_RE.sub(" ", text).split())
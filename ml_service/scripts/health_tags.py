@@ -0,0 +1,63 @@
+"""Vectorized counterpart of search_food.classify for whole columns of foods."""
+
+from __future__ import annotations
+
+from typing import List, Mapping, Tuple
+
+import numpy as np
+
+from search_food import RULES, TAG_BITS, TAG_NAMES, UNKNOWN_BITS, UNKNOWN_FIELDS
+
+
+def _column(columns: Mapping, field: str) -> np.ndarray:
+    # None / NaN -> NaN，与 classify 的 get() 一致
+    return np.asarray(columns[field], dtype=np.float64)
+
+
+def classify_batch(
+    columns: Mapping, rules: Mapping[str, float] = RULES
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Classify every row of a columnar nutrient table at once.
+    `columns` is anything indexable by field name (dict of arrays, pandas
+    DataFrame). Returns (tag_mask, unknown_mask) as uint8 arrays using
+    TAG_BITS / UNKNOWN_BITS; decode_masks() turns them back into the exact
+    dicts classify() returns.
+    """
+    sugar, fat, fiber, sodium = (_column(columns, f) for f in UNKNOWN_FIELDS)
+    with np.errstate(invalid="ignore"):
+        flags = (
+            sugar > rules["high_sugar_g"],
+            fat > rules["high_fat_g"],
+            fiber < rules["low_fiber_g"],
+            sodium > rules["high_sodium_mg"],
+        )
+    tags = np.zeros(sugar.shape, dtype=np.uint8)
+    count = np.zeros(sugar.shape, dtype=np.uint8)
+    for bit, flag in enumerate(flags):
+        tags |= flag.astype(np.uint8) << bit
+        count += flag
+    tags |= (count >= 2).astype(np.uint8) << TAG_NAMES.index("Unbalanced")
+
+    unknown = np.zeros(sugar.shape, dtype=np.uint8)
+    for bit, values in enumerate((sugar, fat, fiber, sodium)):
+        unknown |= np.isnan(values).astype(np.uint8) << bit
+    return tags, unknown
+
+
+def decode_tags(mask: int) -> List[str]:
+    return [name for name, bit in TAG_BITS.items() if mask & bit]
+
+
+def decode_unknown(mask: int) -> List[str]:
+    return [field for field, bit in UNKNOWN_BITS.items() if mask & bit]
+
+
+def decode_masks(tags: np.ndarray, unknown: np.ndarray) -> List[dict]:
+    """Expand mask arrays into classify()-shaped dicts."""
+    tag_lists = [decode_tags(m) for m in range(1 << len(TAG_NAMES))]
+    unk_lists = [decode_unknown(m) for m in range(1 << len(UNKNOWN_FIELDS))]
+    return [
+        {"tags": list(tag_lists[t]), "unknown": list(unk_lists[u])}
+        for t, u in zip(tags.tolist(), unknown.tolist())
+    ]
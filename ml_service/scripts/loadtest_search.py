@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Load test for search_server: p50/p99 latency and requests per second."""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import multiprocessing as mp
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Sequence
+from urllib.parse import quote
+
+from bench_search import misspell
+from search_food import DB
+
+SCRIPTS = Path(__file__).resolve().parent
+LIMITS = (5, 10, 20)
+
+
+def sample_terms(db: Path, n: int, seed: int = 0) -> List[str]:
+    """
+    n queries drawn from the catalog's names and aliases: mostly whole
+    terms, plus half-typed prefixes and one-letter typos, so that repeats
+    are rare and the run measures search rather than the response cache.
+    """
+    con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        names = [
+            r[0]
+            for r in con.execute(
+                "SELECT short_name FROM foods WHERE short_name IS NOT NULL"
+                " UNION SELECT name FROM foods UNION SELECT alias FROM alias"
+            )
+        ]
+    finally:
+        con.close()
+    rng = random.Random(seed)
+    terms = []
+    for _ in range(n):
+        term = rng.choice(names).lower()
+        roll = rng.random()
+        if roll < 0.2:
+            term = term[: rng.randint(3, max(3, len(term) - 1))]  # 输入到一半
+        elif roll < 0.4:
+            term = misspell(term, 1, rng)
+        terms.append(term)
+    return terms
+
+
+def fmt_ms(value: float | None) -> str:
+    return "n/a" if value is None else f"{value:.3f}ms"
+
+
+def client(host: str, port: int, paths: Sequence[str], duration: float, out) -> None:
+    """One keep-alive connection issuing requests back to back."""
+    rng = random.Random()
+    con = http.client.HTTPConnection(host, port)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        path = rng.choice(paths)
+        t0 = time.perf_counter()
+        try:
+            con.request("GET", path)
+            resp = con.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            con.close()
+            con = http.client.HTTPConnection(host, port)
+            continue
+        latencies.append((time.perf_counter() - t0) * 1000)
+    con.close()
+    out.put((latencies, errors))
+
+
+def run_load(
+    host: str, port: int, paths: Sequence[str], clients: int, duration: float
+) -> dict:
+    out = mp.Queue()
+    procs = [
+        mp.Process(target=client, args=(host, port, paths, duration, out))
+        for _ in range(clients)
+    ]
+    for p in procs:
+        p.start()
+    latencies: List[float] = []
+    errors = 0
+    for _ in procs:
+        lat, err = out.get()
+        latencies.extend(lat)
+        errors += err
+    for p in procs:
+        p.join()
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "requests": n,
+        "errors": errors,
+        "rps": n / duration,
+        "p50_ms": statistics.median(latencies) if n else None,
+        "p99_ms": latencies[min(n - 1, int(n * 0.99))] if n else None,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(host: str, port: int, timeout: float = 10.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            con = http.client.HTTPConnection(host, port, timeout=1)
+            con.request("GET", "/metrics")
+            con.getresponse().read()
+            con.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on {host}:{port} did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="existing server to target")
+    parser.add_argument(
+        "--spawn",
+        type=int,
+        nargs="*",
+        default=[1, 4],
+        help="start search_server with each of these worker counts",
+    )
+    parser.add_argument("--db", type=Path, default=DB)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--terms", nargs="*", help="fixed queries instead of a sample")
+    parser.add_argument(
+        "--queries",
+        type=int,
+        default=5000,
+        help="queries sampled from --db when --terms is not given",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="start search_server with its caches disabled",
+    )
+    args = parser.parse_args(argv)
+
+    terms = args.terms or sample_terms(args.db, args.queries)
+    rng = random.Random(1)
+    paths = [f"/search?q={quote(t)}&limit={rng.choice(LIMITS)}" for t in terms]
+    print(f"🎯 {len(set(paths))} distinct request paths")
+    results = {}
+    if args.port:
+        results["external"] = run_load(
+            args.host, args.port, paths, args.clients, args.duration
+        )
+    else:
+        for workers in args.spawn:
+            port = free_port()
+            server = subprocess.Popen(
+                [
+                    sys.executable,
+                    str(SCRIPTS / "search_server.py"),
+                    "--port",
+                    str(port),
+                    "--workers",
+                    str(workers),
+                    "--db",
+                    str(args.db),
+                    *(["--no-cache"] if args.no_cache else []),
+                ],
+                stdout=subprocess.DEVNULL,
+            )
+            try:
+                wait_ready(args.host, port)
+                results[f"workers={workers}"] = run_load(
+                    args.host, port, paths, args.clients, args.duration
+                )
+            finally:
+                server.terminate()
+                server.wait()
+
+    for name, stats in results.items():
+        print(
+            f"{name:>12}  rps={stats['rps']:.0f}  p50={fmt_ms(stats['p50_ms'])}  "
+            f"p99={fmt_ms(stats['p99_ms'])}  errors={stats['errors']}"
+        )
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""Character 3-gram TF-IDF nearest-neighbour matching for noisy food names."""
+
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from food_text import normalize_key
+from search_food import DB, atomic_write, read_build_id
+
+NGRAM = 3
+# 每个打分块的 (查询数 × 条目数) 上限，控制 bincount 的稠密缓冲区大小
+BLOCK_CELLS = 1 << 22
+
+SQL_NAME_ENTRIES = """
+    SELECT f.rowid, f.id, f.name FROM foods AS f
+    UNION ALL
+    SELECT f.rowid, f.id, a.alias FROM alias AS a
+    JOIN foods AS f ON f.id = a.food_id
+    ORDER BY 1"""
+
+
+def sidecar_path(db_path=DB) -> Path:
+    return Path(db_path).with_suffix(".names.npz")
+
+
+def char_ngrams(text: str, n: int = NGRAM) -> List[str]:
+    """n-grams of normalize_key(text), padded so word edges get their own grams."""
+    key = normalize_key(text)
+    if not key:
+        return []
+    padded = f" {key} "
+    return [padded[i : i + n] for i in range(max(1, len(padded) - n + 1))]
+
+
+class NameMatcher:
+    """
+    Sparse TF-IDF index over every foods.name and alias. Entries are
+    L2-normalized rows of (1 + log tf) * idf over character 3-grams; the
+    matrix is kept transposed (postings per n-gram, CSC-style) so a batch
+    of queries is scored with one gather + bincount per block instead of a
+    Python loop over candidates. Entries are grouped by food, so the best
+    entry per food is a single maximum.reduceat.
+    """
+
+    def __init__(
+        self,
+        vocab: np.ndarray,
+        idf: np.ndarray,
+        indptr: np.ndarray,
+        entries: np.ndarray,
+        weights: np.ndarray,
+        food_ids: np.ndarray,
+        food_starts: np.ndarray,
+        n_entries: int,
+        build_id: str | None = None,
+    ):
+        self.vocab = vocab
+        self.idf = idf
+        self.indptr = indptr
+        self.entries = entries
+        self.weights = weights
+        self.food_ids = food_ids
+        self.food_starts = food_starts
+        self.n_entries = n_entries
+        self.build_id = build_id
+        self._gram_index: Dict[str, int] = {g: i for i, g in enumerate(vocab.tolist())}
+
+    @classmethod
+    def build(
+        cls, entries: Iterable[Tuple[str, str]], build_id: str | None = None
+    ) -> "NameMatcher":
+        """`entries` yields (food_id, text) with each food's entries adjacent."""
+        gram_index: Dict[str, int] = {}
+        food_ids: List[str] = []
+        food_starts: List[int] = []
+        rows, cols, counts = [], [], []
+        n_entries = 0
+        for food_id, text in entries:
+            tf = Counter(char_ngrams(text or ""))
+            if not tf:
+                continue
+            if not food_ids or food_ids[-1] != food_id:
+                food_ids.append(food_id)
+                food_starts.append(n_entries)
+            for gram, count in tf.items():
+                rows.append(n_entries)
+                cols.append(gram_index.setdefault(gram, len(gram_index)))
+                counts.append(count)
+            n_entries += 1
+
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        df = np.bincount(cols, minlength=len(gram_index))
+        idf = (np.log((1 + n_entries) / (1 + df)) + 1).astype(np.float32)
+        w = (1 + np.log(np.asarray(counts, dtype=np.float32))) * idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=w * w, minlength=n_entries))
+        w = (w / norms[rows]).astype(np.float32)
+
+        # 按 n-gram 排序得到倒排（转置后的 CSR）
+        order = np.argsort(cols, kind="stable")
+        indptr = np.zeros(len(gram_index) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        return cls(
+            vocab=np.array(list(gram_index), dtype=str),
+            idf=idf,
+            indptr=indptr,
+            entries=rows[order],
+            weights=w[order],
+            food_ids=np.array(food_ids, dtype=str),
+            food_starts=np.asarray(food_starts, dtype=np.int64),
+            n_entries=n_entries,
+            build_id=build_id,
+        )
+
+    @classmethod
+    def from_db(cls, db_path=DB) -> "NameMatcher":
+        con = sqlite3.connect(db_path)
+        try:
+            build_id = read_build_id(con)
+            entries = [(fid, text) for _, fid, text in con.execute(SQL_NAME_ENTRIES)]
+        finally:
+            con.close()
+        return cls.build(entries, build_id=build_id)
+
+    def save(self, path: Path) -> None:
+        # 临时文件 + os.replace：写到一半失败或并发 load 都不会读到残缺的 npz
+        with atomic_write(path) as f:
+            np.savez_compressed(
+                f,
+                vocab=self.vocab,
+                idf=self.idf,
+                indptr=self.indptr,
+                entries=self.entries,
+                weights=self.weights,
+                food_ids=self.food_ids,
+                food_starts=self.food_starts,
+                n_entries=np.int64(self.n_entries),
+                build_id=np.array(self.build_id or ""),
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "NameMatcher":
+        with np.load(path) as z:
+            return cls(
+                vocab=z["vocab"],
+                idf=z["idf"],
+                indptr=z["indptr"],
+                entries=z["entries"],
+                weights=z["weights"],
+                food_ids=z["food_ids"],
+                food_starts=z["food_starts"],
+                n_entries=int(z["n_entries"]),
+                build_id=str(z["build_id"]) or None,
+            )
+
+    def _encode(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        tf = Counter(g for g in char_ngrams(text) if g in self._gram_index)
+        if not tf:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = np.fromiter((self._gram_index[g] for g in tf), dtype=np.int64)
+        w = (1 + np.log(np.fromiter(tf.values(), dtype=np.float32))) * self.idf[ids]
+        return ids, w / np.sqrt(np.dot(w, w))
+
+    def _score_block(self, encoded) -> np.ndarray:
+        """Dense (len(encoded), n_foods) cosine scores of the best entry per food."""
+        n = self.n_entries
+        qrow = np.concatenate(
+            [np.full(len(ids), r, dtype=np.int64) for r, (ids, _) in enumerate(encoded)]
+        )
+        gram = np.concatenate([ids for ids, _ in encoded])
+        qw = np.concatenate([w for _, w in encoded])
+        starts = self.indptr[gram]
+        lens = self.indptr[gram + 1] - starts
+        total = int(lens.sum())
+        # 展开每个查询 n-gram 的倒排区间：starts[i] .. starts[i] + lens[i]
+        offsets = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(total)
+        flat = np.repeat(qrow, lens) * n + self.entries[offsets]
+        vals = self.weights[offsets] * np.repeat(qw, lens)
+        scores = np.bincount(flat, weights=vals, minlength=len(encoded) * n)
+        scores = scores.reshape(len(encoded), n)
+        return np.maximum.reduceat(scores, self.food_starts, axis=1)
+
+    def match_names(
+        self, texts: Sequence[str], k: int = 5
+    ) -> List[List[Tuple[str, float]]]:
+        """Top-k (food_id, cosine) per input text, best first."""
+        out: List[List[Tuple[str, float]]] = []
+        block = max(1, BLOCK_CELLS // max(self.n_entries, 1))
+        k = min(k, len(self.food_ids))
+        for i in range(0, len(texts), block):
+            encoded = [self._encode(t) for t in texts[i : i + block]]
+            if k == 0 or not any(len(ids) for ids, _ in encoded):
+                out.extend([] for _ in encoded)
+                continue
+            scores = self._score_block(encoded)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for ids, vals in zip(top.tolist(), top_scores.tolist()):
+                out.append(
+                    [(str(self.food_ids[j]), v) for j, v in zip(ids, vals) if v > 0]
+                )
+        return out
+
+
+def build_sidecar(db_path=DB) -> Path:
+    """Rebuild the .names.npz next to `db_path` from its current rows."""
+    path = sidecar_path(db_path)
+    NameMatcher.from_db(db_path).save(path)
+    return path
+
+
+def load_matcher(db_path=DB) -> NameMatcher:
+    """Load the sidecar, rebuilding it when missing or from an older build."""
+    path = sidecar_path(db_path)
+    con = sqlite3.connect(db_path)
+    try:
+        build_id = read_build_id(con)
+    finally:
+        con.close()
+    if path.exists():
+        matcher = NameMatcher.load(path)
+        if build_id is None or matcher.build_id == build_id:
+            return matcher
+    build_sidecar(db_path)
+    return NameMatcher.load(path)
+
+
+_default_matcher = None
+_default_matcher_lock = threading.Lock()
+
+
+def match_names(texts: Sequence[str], k: int = 5) -> List[List[Tuple[str, float]]]:
+    global _default_matcher
+    if _default_matcher is None:
+        with _default_matcher_lock:
+            if _default_matcher is None:
+                _default_matcher = load_matcher()
+    return _default_matcher.match_names(texts, k)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "texts",
+        nargs="*",
+        default=["R0TI CANAl RM2.50", "teh tarlk (ice)", "nasi lemak ayam goreng x2"],
+    )
+    parser.add_argument("--db", type=Path, default=DB)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    matcher = load_matcher(args.db)
+    print(
+        f"🔤 Loaded {matcher.n_entries:,} names / {len(matcher.vocab):,} 3-grams "
+        f"in {time.perf_counter() - t0:.2f}s"
+    )
+    for text, hits in zip(args.texts, matcher.match_names(args.texts, args.k)):
+        print(f"\n=== {text!r} ===")
+        for food_id, score in hits:
+            print(f"  {score:.3f}  {food_id}")
+
+
+if __name__ == "__main__":
+    main()
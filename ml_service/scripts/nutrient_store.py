@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Memory-mapped float32 column store of food nutrients for range queries.
+
+python nutrient_store.py "protein_g > 20 and sodium_mg < 400 and category = noodle"
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import operator
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from search_food import DB, NUTRIENT_FIELDS, atomic_write, read_build_id
+
+# 每列一个 .npy（float32，缺失为 NaN）；category 存为字典编码 int32，缺失为 -1
+NO_CATEGORY = -1
+OPS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+CLAUSE_RE = re.compile(r"^\s*(\w+)\s*(<=|>=|==|!=|<|>|=|in)\s*(.+?)\s*$", re.I)
+
+
+def store_dir(db_path=DB) -> Path:
+    return Path(db_path).with_suffix(".columns")
+
+
+class Predicate(NamedTuple):
+    field: str
+    op: str
+    value: object
+
+
+def parse_filter(text: str) -> List[Predicate]:
+    """
+    "protein_g > 20 and sugar_g < 5 and category = noodle" -> predicates.
+    Categories also accept `category in noodle, rice`.
+    """
+    out = []
+    for clause in re.split(r"\s+and\s+", text.strip(), flags=re.I):
+        m = CLAUSE_RE.match(clause)
+        if not m:
+            raise ValueError(f"cannot parse {clause!r}")
+        field, op, raw = m.group(1), m.group(2).lower(), m.group(3)
+        if field == "category":
+            values = [v.strip().strip("'\"") for v in raw.split(",")]
+            out.append(Predicate(field, op, values if op == "in" else values[0]))
+        else:
+            out.append(Predicate(field, op, float(raw)))
+    return out
+
+
+def save_array(path: Path, array: np.ndarray) -> None:
+    """np.save via a temp file + os.replace (never truncates a mapped file)."""
+    with atomic_write(path) as f:
+        np.save(f, array)
+
+
+def export_columns(db_path=DB) -> Path:
+    """Write the nutrient columns, category codes and ids next to `db_path`."""
+    out = store_dir(db_path)
+    out.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(db_path)
+    try:
+        build_id = read_build_id(con)
+        rows = con.execute(
+            f"SELECT id, category, {', '.join(NUTRIENT_FIELDS)} "
+            "FROM foods ORDER BY rowid"
+        ).fetchall()
+    finally:
+        con.close()
+
+    ids = [r[0] for r in rows]
+    categories = [r[1] for r in rows]
+    # None -> NaN
+    matrix = np.array([r[2:] for r in rows], dtype=np.float64)
+    matrix = matrix.reshape(len(rows), len(NUTRIENT_FIELDS)).astype(np.float32)
+    # 每个文件先写临时文件再 os.replace：已 mmap 旧文件的进程不受影响；
+    # meta.json 最后替换，它的 build_id 变了才说明整套列已就位
+    for j, field in enumerate(NUTRIENT_FIELDS):
+        save_array(out / f"{field}.npy", np.ascontiguousarray(matrix[:, j]))
+
+    names = sorted({c for c in categories if c is not None})
+    code = {name: i for i, name in enumerate(names)}
+    save_array(
+        out / "category.npy",
+        np.fromiter((code.get(c, NO_CATEGORY) for c in categories), dtype=np.int32),
+    )
+    # 定长 UTF-8 字节串，可 mmap；查询时只解码命中的行
+    id_bytes = np.array([i.encode("utf-8") for i in ids], dtype=bytes)
+    save_array(out / "ids.npy", id_bytes)
+    # 按 id 排序的行号，row_of() 二分查找用
+    save_array(
+        out / "id_order.npy", np.argsort(id_bytes, kind="stable").astype(np.int64)
+    )
+    with atomic_write(out / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "build_id": build_id,
+                "rows": len(ids),
+                "fields": list(NUTRIENT_FIELDS),
+                "categories": names,
+            },
+            f,
+            ensure_ascii=False,
+        )
+    return out
+
+
+class RangeResult(NamedTuple):
+    ids: List[str]
+    rows: np.ndarray  # 命中行号（foods 的 rowid 顺序）
+    values: Dict[str, np.ndarray]
+
+
+class NutrientStore:
+    """
+    Read-only column store opened with mmap_mode="r": a query only pages
+    in the columns its predicates and requested fields touch, and each
+    predicate is one vectorized comparison ANDed into a boolean mask.
+    """
+
+    def __init__(self, db_path=DB):
+        path = store_dir(db_path)
+        with open(path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.build_id = meta["build_id"]
+        self.rows = meta["rows"]
+        self.categories: List[str] = meta["categories"]
+        self._category_codes: Dict[str, List[int]] = {}
+        for i, name in enumerate(self.categories):
+            self._category_codes.setdefault(name.lower(), []).append(i)
+        self.columns = {
+            field: np.load(path / f"{field}.npy", mmap_mode="r")
+            for field in meta["fields"]
+        }
+        self.category = np.load(path / "category.npy", mmap_mode="r")
+        self._ids = np.load(path / "ids.npy", mmap_mode="r")
+        self._id_order = np.load(path / "id_order.npy", mmap_mode="r")
+
+    def _codes(self, names) -> List[int]:
+        if isinstance(names, str):
+            names = [names]
+        return [c for n in names for c in self._category_codes.get(n.lower(), ())]
+
+    def _mask(self, pred: Predicate) -> np.ndarray:
+        if pred.field == "category":
+            hit = np.isin(self.category, self._codes(pred.value))
+            if pred.op == "!=":
+                return ~hit & (self.category != NO_CATEGORY)
+            if pred.op not in ("=", "==", "in"):
+                raise ValueError(f"category does not support {pred.op!r}")
+            return hit
+        if pred.field not in self.columns:
+            raise ValueError(f"unknown field {pred.field!r}")
+        if pred.op not in OPS:
+            raise ValueError(f"unsupported operator {pred.op!r}")
+        col = self.columns[pred.field]
+        mask = OPS[pred.op](col, np.float32(pred.value))
+        if pred.op == "!=":
+            mask &= ~np.isnan(col)  # 与 SQL 一致：NULL 不满足任何比较
+        return mask
+
+    def row_of(self, food_id: str) -> int | None:
+        """Row number of `food_id` (binary search over the sorted ids)."""
+        key = food_id.encode("utf-8")
+        pos = int(np.searchsorted(self._ids, key, sorter=self._id_order))
+        if pos < len(self._id_order) and self._ids[self._id_order[pos]] == key:
+            return int(self._id_order[pos])
+        return None
+
+    def ids(self, rows: np.ndarray) -> List[str]:
+        return np.char.decode(self._ids[rows], "utf-8").tolist()
+
+    def query(
+        self,
+        predicates: Sequence[Predicate | Tuple[str, str, object]] | str,
+        fields: Sequence[str] | None = None,
+        limit: int | None = None,
+    ) -> RangeResult:
+        """
+        Rows matching every predicate, in catalog order. `predicates` is a
+        list of (field, op, value) or a string for parse_filter(); `fields`
+        defaults to all nutrient columns.
+        """
+        if isinstance(predicates, str):
+            predicates = parse_filter(predicates)
+        mask = np.ones(self.rows, dtype=bool)
+        for pred in predicates:
+            mask &= self._mask(Predicate(*pred))
+        rows = np.flatnonzero(mask)
+        if limit is not None:
+            rows = rows[:limit]
+        fields = list(self.columns) if fields is None else fields
+        return RangeResult(
+            ids=self.ids(rows),
+            rows=rows,
+            values={f: np.asarray(self.columns[f][rows]) for f in fields},
+        )
+
+
+def open_store(db_path=DB) -> NutrientStore:
+    """Open the column store, re-exporting it when missing or stale."""
+    con = sqlite3.connect(db_path)
+    try:
+        build_id = read_build_id(con)
+    finally:
+        con.close()
+    meta = store_dir(db_path) / "meta.json"
+    if meta.exists():
+        # 先比对 build_id，过期的列文件一个都不打开
+        with open(meta, "r", encoding="utf-8") as f:
+            stored = json.load(f).get("build_id")
+        if build_id is None or stored == build_id:
+            return NutrientStore(db_path)
+    export_columns(db_path)
+    return NutrientStore(db_path)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def nutrient_query(predicates, fields=None, limit=None) -> RangeResult:
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = open_store()
+    return _default_store.query(predicates, fields, limit)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "filter",
+        nargs="?",
+        default="protein_g > 20 and sugar_g < 5 and sodium_mg < 400",
+    )
+    parser.add_argument("--db", type=Path, default=DB)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    store = open_store(args.db)
+    t0 = time.perf_counter()
+    result = store.query(args.filter)
+    ms = (time.perf_counter() - t0) * 1000
+    print(f"🧮 {len(result.ids):,} / {store.rows:,} foods match ({ms:.3f} ms)")
+    for i, food_id in enumerate(result.ids[: args.limit]):
+        cells = "  ".join(f"{f}={v[i]:g}" for f, v in result.values.items())
+        print(f"  {food_id}  {cells}")
+
+
+if __name__ == "__main__":
+    main()
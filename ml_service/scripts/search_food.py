@@ -1,25 +1,414 @@
-import sqlite3, math
+import sqlite3, math, os, re, json, threading, base64, hashlib, time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from typing import NamedTuple
+
+from food_text import (
+    MAX_EDIT_DISTANCE,
+    PREFIX_LENGTH,
+    bag_distance,
+    cjk_query,
+    deletes,
+    edit_distance,
+    is_cjk,
+    normalize_key,
+)
 
 ROOT = Path(__file__).resolve().parents[1]
 DB = ROOT / "data" / "build" / "nutrition.db"
 
+SQL_BUILD_ID = "SELECT value FROM meta WHERE key = 'build_id'"
+SQL_TAG_RULES = "SELECT value FROM meta WHERE key = 'tag_rules'"
+SQL_ALIAS = "SELECT food_id FROM alias WHERE alias = :q"
+SQL_FOOD_BY_ID = "SELECT * FROM foods WHERE id = ?"
 
-def classify(n: dict, strategy="conservative"):
-    RULES = {
-        "high_sugar_g": 20,
-        "high_fat_g": 17,
-        "low_fiber_g": 3,
-        "high_sodium_mg": 600,
-    }
-
-    def get(x):
-        return (
-            None if x is None or (isinstance(x, float) and math.isnan(x)) else float(x)
-        )
+# 各阶段 SQL 使用命名参数；{cols} 为投影列，{tags} 处按需插入健康标签过滤
+TAG_FILTER = " AND f.tag_mask IN (SELECT value FROM json_each(:tags))"
+SQL_ALIAS_FOOD = """
+    SELECT {cols} FROM foods AS f
+    WHERE f.id = :food_id{tags}"""
+SQL_EXACT = """
+    SELECT {cols} FROM foods AS f
+    WHERE (f.name = :q OR f.short_name = :q){tags}
+    LIMIT :limit"""
+SQL_NORM = """
+    SELECT {cols} FROM alias_norm AS n
+    JOIN foods AS f ON f.id = n.food_id
+    WHERE n.key = :key{tags}
+    ORDER BY n.rank, f.rowid
+    LIMIT :limit"""
+SQL_FTS = """
+    SELECT {cols} FROM foods_fts
+    JOIN foods AS f ON f.rowid = foods_fts.rowid
+    WHERE foods_fts MATCH :match{tags}
+    ORDER BY bm25(foods_fts, :w_name, :w_aliases)
+    LIMIT :limit"""
+SQL_SUBSTRING = """
+    SELECT {cols} FROM foods_trgm
+    JOIN foods AS f ON f.rowid = foods_trgm.rowid
+    WHERE foods_trgm MATCH :match{tags}
+    LIMIT :limit"""
+SQL_CJK = """
+    SELECT {cols} FROM foods_cjk
+    JOIN foods AS f ON f.rowid = foods_cjk.rowid
+    WHERE foods_cjk MATCH :match{tags}
+    ORDER BY bm25(foods_cjk)
+    LIMIT :limit"""
+# 拼写纠错按词进行：长度差超出编辑距离的词在 SQL 里就被排除，长度最接近的优先
+# 按 SymSpell 的距离下界排序后再截断：共享变体时双方各删去的字符数（只看
+# 前 :prefix 个字符）与长度差取大者；原词自身排在最前，密集词表里也不会被挤掉
+SQL_FUZZY_WORDS = """
+    SELECT word FROM fuzzy_words
+    WHERE variant IN (SELECT value FROM json_each(:variants))
+      AND len BETWEEN :lo AND :hi
+    GROUP BY word
+    ORDER BY word <> :word,
+             MIN(MAX(MIN(:n, :prefix) - length(variant),
+                     MIN(len, :prefix) - length(variant),
+                     abs(len - :n))),
+             abs(len - :n), word
+    LIMIT :pool"""
+# 每个词都是自己的 0 次删除变体：据此判断拆分 / 合并出的词是否已知
+SQL_KNOWN_WORDS = """
+    SELECT word FROM fuzzy_words
+    WHERE variant IN (SELECT value FROM json_each(:words)) AND word = variant"""
+# "did you mean"：经 suggest_deletes 找到前缀相近、长度恰为 :len 的已知词。
+# 按长度逐档查询走 (variant, len) 主键，常见前缀下也不必整体排序；
+# 档内先按距离下界、再按热度截断，近词不会被热门词挤掉
+SQL_SUGGEST_TERMS = """
+    SELECT term, popularity FROM suggest_deletes
+    WHERE variant IN (SELECT value FROM json_each(:variants)) AND len = :len
+    GROUP BY term
+    ORDER BY MIN(MAX(MIN(:n, :prefix), MIN(len, :prefix)) - length(variant)),
+             popularity DESC, term
+    LIMIT :pool"""
+SQL_FOODS_BY_TERMS = """
+    WITH t(term, pos) AS (SELECT value, key FROM json_each(:terms)),
+    hits(id, pos) AS (
+        SELECT a.food_id, t.pos FROM t JOIN alias AS a ON a.alias = t.term
+        UNION ALL
+        SELECT f.id, t.pos FROM t JOIN foods AS f ON f.short_name = t.term
+    )
+    SELECT {cols} FROM foods AS f
+    JOIN (SELECT id, MIN(pos) AS pos FROM hits GROUP BY id) AS h ON h.id = f.id
+    WHERE 1{tags}
+    ORDER BY h.pos
+    LIMIT :limit"""
+SQL_LIKE = """
+    SELECT {cols} FROM foods AS f
+    WHERE (f.name LIKE :pattern OR f.short_name LIKE :pattern){tags}
+    LIMIT :limit"""
+
+# 分页（keyset）：按 (_score, _rowid) 排序，从上一页最后一行之后继续。
+# 首页 :score / :rowid 为 NULL
+SQL_FTS_PAGE = """
+    SELECT * FROM (
+        SELECT bm25(foods_fts, :w_name, :w_aliases) AS _score,
+               f.rowid AS _rowid, {cols}
+        FROM foods_fts
+        JOIN foods AS f ON f.rowid = foods_fts.rowid
+        WHERE foods_fts MATCH :match{tags}
+    )
+    WHERE :score IS NULL OR _score > :score
+       OR (_score = :score AND _rowid > :rowid)
+    ORDER BY _score, _rowid
+    LIMIT :limit"""
+# 子串 / LIKE 没有相关度，score 恒为 0，按 rowid 续扫
+SQL_SUBSTRING_PAGE = """
+    SELECT 0 AS _score, f.rowid AS _rowid, {cols} FROM foods_trgm
+    JOIN foods AS f ON f.rowid = foods_trgm.rowid
+    WHERE foods_trgm MATCH :match AND foods_trgm.rowid > COALESCE(:rowid, 0){tags}
+    ORDER BY foods_trgm.rowid
+    LIMIT :limit"""
+SQL_LIKE_PAGE = """
+    SELECT 0 AS _score, f.rowid AS _rowid, {cols} FROM foods AS f
+    WHERE (f.name LIKE :pattern OR f.short_name LIKE :pattern)
+      AND f.rowid > COALESCE(:rowid, 0){tags}
+    ORDER BY f.rowid
+    LIMIT :limit"""
+
+# 批量查询：待解析的查询以 JSON 数组传入，别名 / 精确命中各用一次 JOIN。
+# 用 json_each 而不是临时表，只读（query_only）连接也能执行
+SQL_BATCH_ALIAS = """
+    WITH b(q) AS (SELECT value FROM json_each(:queries))
+    SELECT b.q AS _q, {cols} FROM b
+    CROSS JOIN alias AS a ON a.alias = b.q
+    JOIN foods AS f ON f.id = a.food_id
+    WHERE 1{tags}"""
+SQL_BATCH_EXACT = """
+    WITH b(q) AS (SELECT value FROM json_each(:queries)),
+    hits(q, rid) AS (
+        SELECT b.q, f.rowid FROM b
+        CROSS JOIN foods AS f ON f.name = b.q
+        WHERE 1{tags}
+        UNION
+        SELECT b.q, f.rowid FROM b
+        CROSS JOIN foods AS f ON f.short_name = b.q
+        WHERE 1{tags}
+    ),
+    ranked AS (
+        SELECT q, rid, ROW_NUMBER() OVER (PARTITION BY q ORDER BY rid) AS n
+        FROM hits
+    )
+    SELECT r.q AS _q, {cols} FROM ranked AS r
+    JOIN foods AS f ON f.rowid = r.rid
+    WHERE r.n <= :limit
+    ORDER BY r.q, r.rid"""
+SQL_BATCH_NORM = """
+    WITH b(q, k) AS (SELECT key, value FROM json_each(:queries)),
+    ranked AS (
+        SELECT b.q, f.rowid AS rid,
+               ROW_NUMBER() OVER (PARTITION BY b.q ORDER BY n.rank, f.rowid) AS n
+        FROM b
+        CROSS JOIN alias_norm AS n ON n.key = b.k
+        JOIN foods AS f ON f.id = n.food_id
+        WHERE 1{tags}
+    )
+    SELECT r.q AS _q, {cols} FROM ranked AS r
+    JOIN foods AS f ON f.rowid = r.rid
+    WHERE r.n <= :limit
+    ORDER BY r.q, r.n"""
+BATCH_STAGES = ("alias", "exact", "norm")
+
+# 合并排序模式：各来源的候选 (rid, score, src) 用 UNION ALL 合并后按 rowid 去重，
+# 同一食物的各来源分数相加，一条语句返回混合排序后的 top-k
+# 标签过滤放进每个来源的子查询、在 LIMIT :pool 之前生效，
+# 否则候选池被不合格的行占满时会返回空结果
+RANK_SOURCES = {
+    "alias": """
+        SELECT f.rowid, :w_alias, 'alias' FROM alias AS a
+        JOIN foods AS f ON f.id = a.food_id
+        WHERE a.alias = :q{tags}""",
+    "exact": """
+        SELECT * FROM (
+            SELECT f.rowid, :w_exact, 'exact' FROM foods AS f
+            WHERE (f.name = :q OR f.short_name = :q){tags}
+            LIMIT :pool
+        )""",
+    "norm": """
+        SELECT * FROM (
+            SELECT f.rowid, :w_norm, 'norm' FROM alias_norm AS n
+            JOIN foods AS f ON f.id = n.food_id
+            WHERE n.key = :key{tags}
+            LIMIT :pool
+        )""",
+    # bm25 为负数、越小越好；除以本次最优值，最佳命中得满分 :w_fts
+    "fts": """
+        SELECT rowid, :w_fts * b / MIN(MIN(b) OVER (), -1e-9), 'fts' FROM (
+            SELECT f.rowid, bm25(foods_fts, :w_name, :w_aliases) AS b FROM foods_fts
+            JOIN foods AS f ON f.rowid = foods_fts.rowid
+            WHERE foods_fts MATCH :match{tags}
+            ORDER BY b
+            LIMIT :pool
+        )""",
+    "cjk": """
+        SELECT * FROM (
+            SELECT f.rowid, :w_cjk, 'cjk' FROM foods_cjk
+            JOIN foods AS f ON f.rowid = foods_cjk.rowid
+            WHERE foods_cjk MATCH :cjk{tags}
+            ORDER BY bm25(foods_cjk)
+            LIMIT :pool
+        )""",
+    "substring": """
+        SELECT * FROM (
+            SELECT f.rowid, :w_substring, 'substring' FROM foods_trgm
+            JOIN foods AS f ON f.rowid = foods_trgm.rowid
+            WHERE foods_trgm MATCH :trgm{tags}
+            LIMIT :pool
+        )""",
+}
+SQL_RANKED = """
+    WITH c(rid, score, src) AS ({sources}
+    ),
+    b AS (
+        SELECT rid, SUM(score) AS score, GROUP_CONCAT(src) AS srcs
+        FROM c GROUP BY rid
+    )
+    SELECT b.score AS _score, b.srcs AS _sources, {{cols}} FROM b
+    JOIN foods AS f ON f.rowid = b.rid
+    ORDER BY b.score DESC, f.rowid
+    LIMIT :limit"""
+# 各来源的分数上限；精确 / 别名命中压过全文与子串，多来源同时命中则叠加
+RANK_WEIGHTS = {
+    "alias": 1.0,
+    "exact": 1.0,
+    "norm": 0.8,
+    "fts": 0.6,
+    "cjk": 0.5,
+    "substring": 0.3,
+}
+# 每个来源最多取的候选数（至少为 limit 的 4 倍）
+RANK_POOL = 50
+
+# memory 模式：同一进程内的引擎共享一份按文件签名命名的内存库
+MEMORY_URI = "file:nutrition-{key}?mode=memory&cache=shared"
+_memory_lock = threading.Lock()
+
+# 拼写纠错：每个查询词最多核对的候选词数，拼回的候选短语上限
+FUZZY_POOL = 32
+FUZZY_TERMS = 256
+
+# 建议词表只收不超过该长度的别名 / 短名；候选池上限
+SUGGEST_MAX_LEN = 32
+SUGGEST_POOL = 500
+
+# serving 模式的页缓存大小（KiB）
+SERVING_CACHE_KIB = 64 * 1024
+
+# bm25 列权重：(name, aliases)，数值越大该列命中越重要
+FTS_WEIGHTS = (2.0, 1.0)
+TOKEN_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=None)
+def sql(template: str, filtered: bool, cols: str = "f.*") -> str:
+    """Stage SQL with its select list and optional tag_mask filter filled in."""
+    return template.format(cols=cols, tags=TAG_FILTER if filtered else "")
+
+
+@lru_cache(maxsize=None)
+def ranked_sql(sources: tuple) -> str:
+    """SQL_RANKED over the given candidate sources ({cols} / {tags} left open)."""
+    union = "\n        UNION ALL".join(RANK_SOURCES[s] for s in sources)
+    return SQL_RANKED.format(sources=union)
+
+
+def tag_filter(include_tags=(), exclude_tags=()):
+    """
+    JSON list of every tag_mask value that carries all `include_tags` and
+    none of `exclude_tags`, or None when no filter is requested. Matching
+    against the explicit value list keeps idx_foods_tags usable.
+    """
+    if not include_tags and not exclude_tags:
+        return None
+    unknown = (set(include_tags) | set(exclude_tags)) - TAG_BITS.keys()
+    if unknown:
+        raise ValueError(f"unknown tags: {sorted(unknown)}")
+    inc = sum(TAG_BITS[t] for t in set(include_tags))
+    exc = sum(TAG_BITS[t] for t in set(exclude_tags))
+    allowed = [m for m in range(1 << len(TAG_NAMES)) if m & inc == inc and not m & exc]
+    return json.dumps(allowed)
+
+
+def fts_query(q: str):
+    """
+    Turn free text into an FTS5 MATCH expression that ANDs every token.
+    Tokens are quoted so FTS operators in user input are taken literally.
+    """
+    tokens = TOKEN_RE.findall(q)
+    return " ".join(f'"{t}"' for t in tokens) or None
+
+
+def trigram_query(q: str):
+    """
+    Quote the whole query as one phrase for the trigram index, which turns
+    it into a case-insensitive substring match. Needs at least 3 chars.
+    """
+    if len(q) < 3:
+        return None
+    return '"' + q.replace('"', '""') + '"'
+
+
+FOOD_COLUMNS = (
+    "id",
+    "name",
+    "short_name",
+    "category",
+    "quantity",
+    "brands",
+    "food_groups",
+    "energy_kcal",
+    "protein_g",
+    "fat_g",
+    "sat_fat_g",
+    "carb_g",
+    "sugar_g",
+    "fiber_g",
+    "sodium_mg",
+    "source",
+    "tag_mask",
+    "unknown_mask",
+)
+NUTRIENT_FIELDS = FOOD_COLUMNS[7:15]
+
+
+class FoodHit(NamedTuple):
+    """
+    Compact search hit returned when a `fields=` projection is requested.
+    Only the projected columns are fetched; the rest stay None.
+    """
+
+    id: str | None = None
+    name: str | None = None
+    short_name: str | None = None
+    category: str | None = None
+    quantity: str | None = None
+    brands: str | None = None
+    food_groups: str | None = None
+    energy_kcal: float | None = None
+    protein_g: float | None = None
+    fat_g: float | None = None
+    sat_fat_g: float | None = None
+    carb_g: float | None = None
+    sugar_g: float | None = None
+    fiber_g: float | None = None
+    sodium_mg: float | None = None
+    source: str | None = None
+    tag_mask: int | None = None
+    unknown_mask: int | None = None
+
+    def get(self, key, default=None):
+        """dict-style access so classify() accepts hits directly."""
+        return getattr(self, key, default)
+
+
+def batch_row(row, projected=False, skip=1):
+    """Row minus the leading bookkeeping columns (_q, or _score and _rowid)."""
+    if projected:
+        return FoodHit._make(row[skip:])
+    return {k: row[k] for k in row.keys()[skip:]}
+
+
+# 与后端共用同一份阈值配置；文件缺失时用默认值
+THRESHOLDS = ROOT.parent / "backend" / "src" / "settings" / "nutrition.thresholds.json"
+DEFAULT_RULES = {
+    "high_sugar_g": 20,
+    "high_fat_g": 17,
+    "low_fiber_g": 3,
+    "high_sodium_mg": 600,
+}
+
+
+def load_tag_rules(path: Path = THRESHOLDS) -> dict:
+    """classify() thresholds from the backend settings, defaults if absent."""
+    rules = dict(DEFAULT_RULES)
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            settings = json.load(f)
+        rules.update({k: float(settings[k]) for k in DEFAULT_RULES if k in settings})
+    return rules
+
+
+# classify() 与构建时写入的 tag_mask 使用同一份阈值
+RULES = load_tag_rules()
+
+# classify() 标签与未知字段的位定义（tag_mask / unknown_mask 列使用同一布局）
+TAG_NAMES = ("High Sugar", "High Fat", "Low Fiber", "High Sodium", "Unbalanced")
+TAG_BITS = {name: 1 << i for i, name in enumerate(TAG_NAMES)}
+UNKNOWN_FIELDS = ("sugar_g", "fat_g", "fiber_g", "sodium_mg")
+UNKNOWN_BITS = {field: 1 << i for i, field in enumerate(UNKNOWN_FIELDS)}
 
+
+def _get(x):
+    return None if x is None or (isinstance(x, float) and math.isnan(x)) else float(x)
+
+
+def classify(n: dict, strategy="conservative"):
     sugar, fat, fiber, sodium = map(
-        get, (n.get("sugar_g"), n.get("fat_g"), n.get("fiber_g"), n.get("sodium_mg"))
+        _get, (n.get("sugar_g"), n.get("fat_g"), n.get("fiber_g"), n.get("sodium_mg"))
     )
     tags, unk = [], []
     if sugar is None:
@@ -43,62 +432,943 @@ def classify(n: dict, strategy="conservative"):
     return {"tags": tags, "unknown": unk}
 
 
-def search_food(q: str, limit=5):
-    q = q.strip().lower()
-    con = sqlite3.connect(DB)
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
+def file_signature(path: Path):
+    st = path.stat()
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+@contextmanager
+def atomic_write(path: Path, mode="wb", **kwargs):
+    """
+    Open a temp file next to `path` and os.replace() it over `path` once
+    the block succeeds. Readers never see a half-written file, and mmaps of
+    the old file stay valid (truncating a mapped file in place is SIGBUS).
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def read_build_id(con: sqlite3.Connection) -> str | None:
+    """meta.build_id of an open database; None for old DBs without meta."""
+    try:
+        row = con.execute(SQL_BUILD_ID).fetchone()
+    except sqlite3.OperationalError:
+        return None  # 旧库没有 meta 表
+    return row[0] if row else None
+
+
+def read_tag_rules(con: sqlite3.Connection) -> dict | None:
+    """Thresholds the stored tag_mask was computed with; None if unrecorded."""
+    try:
+        row = con.execute(SQL_TAG_RULES).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return json.loads(row[0]) if row else None
+
+
+class ResultCache:
+    """Bounded LRU of search results with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# 阶段耗时直方图的桶上界：0.01 ms 起按 1.25 倍递增，约到 12 s
+STAGE_BUCKETS_MS = tuple(0.01 * 1.25**i for i in range(64))
+
+
+class StageTiming(NamedTuple):
+    stage: str
+    ms: float
+    rows: int  # 该阶段取回的行数
+
+
+class StageStats:
+    """
+    In-process latency histograms per search stage, plus which stage
+    answered each call. Quantiles are read off fixed log-spaced buckets
+    (upper bound, within 25%), so observe() is a bisect and a few adds.
+    One instance can be shared by several engines.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.buckets = {}
+            self.sum_ms = {}
+            self.rows = {}
+            self.answered = {}
+            self.cache_hits = 0
+
+    def observe(self, trace, answered, total_ms, cached=False):
+        with self._lock:
+            for t in (*trace, StageTiming("total", total_ms, 0)):
+                counts = self.buckets.get(t.stage)
+                if counts is None:
+                    counts = self.buckets[t.stage] = [0] * (len(STAGE_BUCKETS_MS) + 1)
+                    self.sum_ms[t.stage] = 0.0
+                    self.rows[t.stage] = 0
+                counts[bisect_left(STAGE_BUCKETS_MS, t.ms)] += 1
+                self.sum_ms[t.stage] += t.ms
+                self.rows[t.stage] += t.rows
+            key = answered or "none"
+            self.answered[key] = self.answered.get(key, 0) + 1
+            self.cache_hits += cached
+
+    @staticmethod
+    def quantile(counts, q):
+        rank = q * sum(counts)
+        seen = 0
+        for i, n in enumerate(counts):
+            seen += n
+            if n and seen >= rank:
+                return STAGE_BUCKETS_MS[i] if i < len(STAGE_BUCKETS_MS) else math.inf
+        return 0.0
+
+    def snapshot(self):
+        """
+        {"stages": {stage: {count, p50_ms, p95_ms, p99_ms, mean_ms, rows}},
+         "answered": {stage: calls}, "cache_hits": n}; "total" is the whole call.
+        """
+        with self._lock:
+            stages = {}
+            for stage, counts in self.buckets.items():
+                n = sum(counts)
+                stages[stage] = {
+                    "count": n,
+                    "p50_ms": self.quantile(counts, 0.50),
+                    "p95_ms": self.quantile(counts, 0.95),
+                    "p99_ms": self.quantile(counts, 0.99),
+                    "mean_ms": self.sum_ms[stage] / n,
+                    "rows": self.rows[stage],
+                }
+            return {
+                "stages": stages,
+                "answered": dict(self.answered),
+                "cache_hits": self.cache_hits,
+            }
+
+
+class StageQuery(NamedTuple):
+    """One normalized search request as seen by the stages (and cache key)."""
+
+    q: str
+    limit: int
+    tags: str | None = None  # JSON list of allowed tag_mask values
+    cols: str = "f.*"  # SELECT list, see SearchEngine._select_list
+
+    @property
+    def projected(self):
+        return self.cols != "f.*"
+
+    def sql(self, template):
+        return sql(template, self.tags is not None, self.cols)
+
+
+class Suggestion(NamedTuple):
+    term: str
+    distance: int
+    popularity: int
+
+
+class RankedHit(NamedTuple):
+    """One rank() result: the row, its blended score and the sources that matched."""
+
+    food: dict | FoodHit
+    score: float
+    sources: tuple
+
+
+def copy_result(result):
+    """Callers get their own row dicts so mutations never reach the cache."""
+    stage, rows = result
+    return stage, [r if isinstance(r, FoodHit) else dict(r) for r in rows]
+
+
+class SearchEngine:
+    """
+    Long-lived search handle over nutrition.db.
+    Keeps one connection open so the schema, prepared statements and page
+    cache stay warm between queries instead of being rebuilt per call.
+    """
+
+    def __init__(
+        self,
+        db_path=DB,
+        fts_weights=FTS_WEIGHTS,
+        cache_size=1024,
+        serving=False,
+        stats: StageStats | None = None,
+        memory=False,
+    ):
+        """
+        serving=True opens the file read-only and immutable with the whole
+        file memory-mapped, a larger page cache, query_only and in-memory
+        temp storage. A rebuild is picked up by reopening once the file's
+        stat signature changes.
+        memory=True copies the whole database into RAM at startup with
+        Connection.backup() and serves every query from there; engines in
+        the same process share one copy, and a rebuilt file is re-copied
+        the same way serving mode reopens it.
+        stats=StageStats() records per-stage timings of every resolve();
+        without it the stages run untimed.
+        """
+        self.db_path = Path(db_path)
+        self.fts_weights = tuple(fts_weights)
+        self.serving = serving
+        self.memory = memory
+        self.cache = ResultCache(cache_size)
+        self.stats = stats
+        self._data_version = None
+        self._build_id = None
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        if self.memory:
+            con = self._open_memory()
+        elif self.serving:
+            self._file_sig = file_signature(self.db_path)
+            uri = f"{self.db_path.resolve().as_uri()}?mode=ro&immutable=1"
+            con = sqlite3.connect(
+                uri, uri=True, check_same_thread=False, isolation_level=None
+            )
+            con.execute(f"PRAGMA mmap_size = {self._file_sig[1]}")
+            con.execute(f"PRAGMA cache_size = -{SERVING_CACHE_KIB}")
+            con.execute("PRAGMA query_only = ON")
+            con.execute("PRAGMA temp_store = MEMORY")
+        else:
+            self._file_sig = file_signature(self.db_path)
+            # 连接可跨线程复用，由 _lock 串行化访问；autocommit 避免长读事务
+            con = sqlite3.connect(
+                self.db_path, check_same_thread=False, isolation_level=None
+            )
+        con.row_factory = sqlite3.Row
+        self._con = con
+        self._probe_schema()
+
+    def _probe_schema(self):
+        """Tables, foods columns and tag thresholds the stages adapt to."""
+        con = self._con
+        self._tables = {
+            r[0]
+            for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        self._food_columns = {
+            r["name"] for r in con.execute("PRAGMA table_info(foods)")
+        }
+        self._tag_rules = read_tag_rules(con)
+
+    def _open_memory(self):
+        self._file_sig = file_signature(self.db_path)
+        path = str(self.db_path.resolve())
+        key = hashlib.blake2b(repr((path, self._file_sig)).encode(), digest_size=8)
+        con = sqlite3.connect(
+            MEMORY_URI.format(key=key.hexdigest()),
+            uri=True,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        with _memory_lock:
+            # 第一个引擎负责拷贝；索引（含 FTS 影子表）都是普通表，随 backup 一并复制
+            if not con.execute("SELECT count(*) FROM sqlite_master").fetchone()[0]:
+                src = sqlite3.connect(f"{Path(path).as_uri()}?mode=ro", uri=True)
+                try:
+                    src.backup(con)
+                finally:
+                    src.close()
+        con.execute("PRAGMA query_only = ON")
+        # 只读数据：共享缓存下读不加表锁，引擎之间互不阻塞
+        con.execute("PRAGMA read_uncommitted = ON")
+        con.execute("PRAGMA temp_store = MEMORY")
+        return con
+
+    def close(self):
+        with self._lock:
+            self._con.close()
+
+    def interrupt(self):
+        """Abort the statement running on this engine (safe from any thread)."""
+        self._con.interrupt()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(
+        self,
+        q: str,
+        limit=5,
+        include_tags=(),
+        exclude_tags=(),
+        fields=None,
+        explain=False,
+        ranked=False,
+    ):
+        """
+        Hits of resolve(), or with ranked=True the blended top-k of rank().
+        explain applies to the staged mode only.
+        """
+        if ranked:
+            if explain:
+                raise ValueError("explain is only available for staged search")
+            hits = self.rank(q, limit, include_tags, exclude_tags, fields)
+            return [h.food for h in hits]
+        result = self.resolve(q, limit, include_tags, exclude_tags, fields, explain)
+        return (result[1], result[2]) if explain else result[1]
+
+    def resolve(
+        self,
+        q: str,
+        limit=5,
+        include_tags=(),
+        exclude_tags=(),
+        fields=None,
+        explain=False,
+    ):
+        """
+        Run the search stages in order and stop at the first one with hits.
+        include_tags / exclude_tags restrict hits by their stored health
+        tags (e.g. exclude_tags=["High Sugar"]) inside each stage's query.
+        fields=("id", "name", ...) fetches only those columns and returns
+        FoodHit tuples instead of full row dicts.
+        Returns (stage, rows); stage is None when nothing matched.
+        explain=True returns (stage, rows, explain) where explain lists the
+        time and rows fetched of every stage that ran.
+        """
+        sq = self._query(q, limit, include_tags, exclude_tags, fields)
+        # 未开启统计且不需要 explain 时不计时
+        trace = [] if explain or self.stats is not None else None
+        t0 = time.perf_counter()
+        cached = False
+        with self._lock:
+            build_id = self._current_build()
+            key = (build_id, sq)
+            result = self.cache.get(key) if build_id is not None else None
+            if result is not None:
+                cached = True
+            else:
+                result = self._run_stages(self._con.cursor(), sq, self._stages, trace)
+                if build_id is not None:
+                    self.cache.put(key, result)
+            result = copy_result(result)
+        if trace is None:
+            return result
+        total_ms = (time.perf_counter() - t0) * 1000
+        if self.stats is not None:
+            self.stats.observe(trace, result[0], total_ms, cached)
+        if not explain:
+            return result
+        return result + (
+            {
+                "stage": result[0],
+                "cached": cached,
+                "total_ms": total_ms,
+                "stages": [t._asdict() for t in trace],
+            },
+        )
+
+    def rank(self, q: str, limit=5, include_tags=(), exclude_tags=(), fields=None):
+        """
+        Unified ranking in one statement: alias, exact, norm, fts, cjk and
+        substring candidates are gathered together, deduped by food and
+        ordered by the sum of their per-source scores (RANK_WEIGHTS; fts is
+        scaled by bm25 relative to the best match). A weak alias hit no
+        longer hides better full-text matches, and a miss costs one round
+        trip instead of one per stage. Fuzzy and like are staged-only.
+        Returns a list of RankedHit, best first.
+        """
+        sq = self._query(q, limit, include_tags, exclude_tags, fields)
+        params = self._rank_params(sq)
+        with self._lock:
+            build_id = self._current_build()
+            key = ("rank", build_id, sq)
+            hits = self.cache.get(key) if build_id is not None else None
+            if hits is None:
+                hits = []
+                if params is not None:
+                    template = ranked_sql(params.pop("_sources"))
+                    rows = self._con.execute(sq.sql(template), params).fetchall()
+                    hits = [
+                        RankedHit(
+                            batch_row(r, sq.projected, skip=2),
+                            r[0],
+                            tuple(dict.fromkeys(r[1].split(","))),
+                        )
+                        for r in rows
+                    ]
+                if build_id is not None:
+                    self.cache.put(key, hits)
+        return [h if sq.projected else h._replace(food=dict(h.food)) for h in hits]
+
+    def _rank_params(self, sq):
+        """Bound parameters for ranked_sql(); "_sources" lists the applicable ones."""
+        if not sq.q:
+            return None
+        sources = ["alias", "exact"]
+        params = {"q": sq.q, "limit": sq.limit, "tags": sq.tags}
+        key = normalize_key(sq.q)
+        if key and "alias_norm" in self._tables:
+            sources.append("norm")
+            params["key"] = key
+        fts = self._fts_params(sq)
+        if fts is not None:
+            sources.append("fts")
+            params.update((k, fts[k]) for k in ("match", "w_name", "w_aliases"))
+        cjk = cjk_query(sq.q)
+        if cjk and "foods_cjk" in self._tables:
+            sources.append("cjk")
+            params["cjk"] = cjk
+        trgm = self._substring_params(sq)
+        if trgm is not None:
+            sources.append("substring")
+            params["trgm"] = trgm["match"]
+        params.update({f"w_{s}": RANK_WEIGHTS[s] for s in sources})
+        params["pool"] = max(RANK_POOL, 4 * sq.limit)
+        params["_sources"] = tuple(sources)
+        return params
+
+    def _query(self, q, limit, include_tags, exclude_tags, fields):
+        tags = tag_filter(include_tags, exclude_tags)
+        with self._lock:
+            self._current_build()  # 先刷新 schema，列 / 表可能已经变了
+        if tags is not None and "tag_mask" not in self._food_columns:
+            raise ValueError(f"{self.db_path} has no tag_mask column; rebuild it")
+        if tags is not None and self._tag_rules != RULES:
+            # 阈值配置改过而库没重建：tag_mask 与 classify() 会给出不同答案
+            raise ValueError(
+                f"{self.db_path} tag_mask was built with thresholds "
+                f"{self._tag_rules}, not {RULES}; rebuild it"
+            )
+        return StageQuery(q.strip().lower(), limit, tags, self._select_list(fields))
+
+    def _select_list(self, fields):
+        """SELECT list for a projection; skipped columns are bound as NULL."""
+        if fields is None:
+            return "f.*"
+        unknown = set(fields) - set(FOOD_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown fields: {sorted(unknown)}")
+        return ", ".join(
+            f"f.{c}" if c in fields and c in self._food_columns else "NULL"
+            for c in FOOD_COLUMNS
+        )
+
+    def food(self, food_id: str):
+        """Single food row by id, or None."""
+        with self._lock:
+            row = self._con.execute(SQL_FOOD_BY_ID, (food_id,)).fetchone()
+        return dict(row) if row else None
+
+    def build_id(self):
+        with self._lock:
+            return self._current_build()
+
+    def _current_build(self):
+        """
+        Build id of the database as seen right now. A build replaces the
+        file, so a changed stat signature reopens the connection; otherwise
+        data_version changes whenever another connection commits, which is
+        the only time the id and the schema probe need re-reading. A new id
+        drops every cached result.
+        """
+        if file_signature(self.db_path) != self._file_sig:
+            # 构建用 os.replace 换上新文件：旧连接仍读着旧 inode（immutable /
+            # 内存连接也看不到原地改写），文件变化后重新打开
+            self._con.close()
+            self._open()
+            self._data_version = None
+        cur = self._con.cursor()
+        version = cur.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            # 其他连接可能原地加表 / 改列（例如只重建某个索引），重新探测
+            self._probe_schema()
+            build_id = read_build_id(self._con)  # None：旧库，不缓存
+            if build_id != self._build_id:
+                self._build_id = build_id
+                self.cache.clear()
+        return self._build_id
+
+    def _run_stages(self, cur, sq, stages, trace=None):
+        for stage, run in stages:
+            if trace is None:
+                rows = run(cur, sq)
+            else:
+                t0 = time.perf_counter()
+                rows = run(cur, sq)
+                ms = (time.perf_counter() - t0) * 1000
+                trace.append(StageTiming(stage, ms, len(rows)))
+            if rows:
+                return stage, self._hits(sq, rows)
+        return None, []
+
+    @staticmethod
+    def _hits(sq, rows):
+        if sq.projected:
+            return [FoodHit._make(r) for r in rows]
+        return [dict(r) for r in rows]
+
+    def search_many(
+        self, queries, limit=5, include_tags=(), exclude_tags=(), fields=None
+    ):
+        return {
+            q: rows
+            for q, (_, rows) in self.resolve_many(
+                queries, limit, include_tags, exclude_tags, fields
+            ).items()
+        }
+
+    def resolve_many(
+        self, queries, limit=5, include_tags=(), exclude_tags=(), fields=None
+    ):
+        """
+        Resolve a batch of queries in one pass. The normalized queries are
+        bound as one JSON array so the alias, exact and norm stages each run
+        as a single join; only the leftovers go through the remaining stages.
+        Returns {input: (stage, rows)}.
+        """
+        base = self._query("", limit, include_tags, exclude_tags, fields)
+        norm = {q: q.strip().lower() for q in queries}
+        params = {"limit": limit, "tags": base.tags}
+        found = {}
+        with self._lock:
+            build_id = self._current_build()
+            cur = self._con.cursor()
+            cached = {}
+            if build_id is not None:
+                for q in set(norm.values()):
+                    hit = self.cache.get((build_id, base._replace(q=q)))
+                    if hit is not None:
+                        cached[q] = hit
+            pending = set(norm.values()) - cached.keys()
+
+            projected = base.projected
+            params["queries"] = json.dumps(sorted(pending))
+            for row in cur.execute(base.sql(SQL_BATCH_ALIAS), params):
+                hits = found.setdefault(row["_q"], ("alias", []))[1]
+                hits.append(batch_row(row, projected))
+            params["queries"] = json.dumps(sorted(pending - found.keys()))
+            for row in cur.execute(base.sql(SQL_BATCH_EXACT), params):
+                hits = found.setdefault(row["_q"], ("exact", []))[1]
+                hits.append(batch_row(row, projected))
+            if "alias_norm" in self._tables:
+                params["queries"] = json.dumps(
+                    {q: normalize_key(q) for q in sorted(pending - found.keys())}
+                )
+                for row in cur.execute(base.sql(SQL_BATCH_NORM), params):
+                    hits = found.setdefault(row["_q"], ("norm", []))[1]
+                    hits.append(batch_row(row, projected))
+
+            rest = [s for s in self._stages if s[0] not in BATCH_STAGES]
+            for q in pending - found.keys():
+                found[q] = self._run_stages(cur, base._replace(q=q), rest)
+            if build_id is not None:
+                for q, result in found.items():
+                    self.cache.put((build_id, base._replace(q=q)), result)
+            found.update(cached)
+        return {q: copy_result(found[n]) for q, n in norm.items()}
+
+    def search_page(
+        self,
+        q: str,
+        limit=20,
+        cursor=None,
+        include_tags=(),
+        exclude_tags=(),
+        fields=None,
+    ):
+        """
+        Like resolve(), but the fts, substring and like stages return
+        `limit` rows at a time plus an opaque cursor for the next page
+        (None on the last page). Pages seek past the previous page's last
+        (score, rowid) instead of using OFFSET, so a deep page never fetches
+        and discards the rows before it. Other stages return their hits as
+        a single page. Cursors are tied to the query, its tag filters and
+        the build id; a stale or foreign cursor raises ValueError.
+        Returns (stage, rows, next_cursor).
+        """
+        sq = self._query(q, limit, include_tags, exclude_tags, fields)
+        paged = self._paged_stages
+        with self._lock:
+            build_id = self._current_build()
+            cur = self._con.cursor()
+            if cursor is not None:
+                stage, after = self._decode_cursor(cursor, sq, build_id)
+                rows = self._page(cur, sq, stage, after)
+            else:
+                for stage, run in self._stages:
+                    if stage not in paged:
+                        # 非分页阶段：命中即整页返回，没有下一页
+                        rows = run(cur, sq)
+                        if rows:
+                            return stage, self._hits(sq, rows), None
+                        continue
+                    rows = self._page(cur, sq, stage, None)
+                    if rows:
+                        break
+                else:
+                    return None, [], None
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = self._encode_cursor(stage, (last[0], last[1]), sq, build_id)
+        return stage, [batch_row(r, sq.projected, skip=2) for r in rows], next_cursor
+
+    @staticmethod
+    def _cursor_digest(sq):
+        # 游标只对同一查询与标签过滤有效
+        key = json.dumps([sq.q, sq.tags]).encode()
+        return hashlib.blake2b(key, digest_size=8).hexdigest()
+
+    def _encode_cursor(self, stage, after, sq, build_id):
+        raw = json.dumps(
+            [stage, *after, build_id, self._cursor_digest(sq)], separators=(",", ":")
+        )
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def _decode_cursor(self, cursor, sq, build_id):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            stage, score, rowid, cursor_build, digest = json.loads(raw)
+        except (ValueError, TypeError):
+            raise ValueError("invalid cursor") from None
+        if stage not in self._paged_stages or digest != self._cursor_digest(sq):
+            raise ValueError("cursor does not belong to this query")
+        if cursor_build != build_id:
+            raise ValueError("cursor is from an older build; start again")
+        return stage, (score, rowid)
+
+    @property
+    def _stages(self):
+        return (
+            ("alias", self._alias),
+            ("exact", self._exact),
+            ("norm", self._norm),
+            ("fts", self._fts),
+            ("cjk", self._cjk),
+            ("substring", self._substring),
+            ("fuzzy", self._fuzzy),
+            ("like", self._like),
+        )
 
     # A. 先查 alias（只来自本地补充，更精准）
-    r = cur.execute("SELECT food_id FROM alias WHERE alias = ?", (q,)).fetchone()
-    if r:
-        food = cur.execute(
-            "SELECT * FROM foods WHERE id = ?", (r["food_id"],)
-        ).fetchone()
-        con.close()
-        return [dict(food)] if food else []
+    def _alias(self, cur, sq):
+        r = cur.execute(SQL_ALIAS, {"q": sq.q}).fetchone()
+        if not r:
+            return []
+        params = {"food_id": r["food_id"], "tags": sq.tags}
+        return cur.execute(sq.sql(SQL_ALIAS_FOOD), params).fetchall()
 
     # B. 精确命中（name / short_name）
-    rows = cur.execute(
-        """
-        SELECT * FROM foods 
-        WHERE name = ? OR short_name = ?
-        LIMIT ?""",
-        (q, q, limit),
-    ).fetchall()
-    if rows:
-        con.close()
-        return [dict(r) for r in rows]
+    def _exact(self, cur, sq):
+        params = {"q": sq.q, "limit": sq.limit, "tags": sq.tags}
+        return cur.execute(sq.sql(SQL_EXACT), params).fetchall()
+
+    # B2. 规范化键命中（大小写、标点、变音符、复数折叠后的一次主键查找）
+    def _norm(self, cur, sq):
+        key = normalize_key(sq.q)
+        if not key or "alias_norm" not in self._tables:
+            return []
+        params = {"key": key, "limit": sq.limit, "tags": sq.tags}
+        return cur.execute(sq.sql(SQL_NORM), params).fetchall()
+
+    # C. 全文检索（foods_fts，按 bm25 排序）
+    def _fts(self, cur, sq):
+        params = self._fts_params(sq)
+        if params is None:
+            return []
+        return cur.execute(sq.sql(SQL_FTS), params).fetchall()
+
+    def _fts_params(self, sq):
+        match = fts_query(sq.q)
+        if not match:
+            return None
+        w_name, w_aliases = self.fts_weights
+        return {
+            "match": match,
+            "w_name": w_name,
+            "w_aliases": w_aliases,
+            "limit": sq.limit,
+            "tags": sq.tags,
+        }
+
+    # C2. 中文（foods_cjk 单字 / 双字索引，unicode61 无法切分中文）
+    def _cjk(self, cur, sq):
+        match = cjk_query(sq.q)
+        if not match or "foods_cjk" not in self._tables:
+            return []
+        params = {"match": match, "limit": sq.limit, "tags": sq.tags}
+        return cur.execute(sq.sql(SQL_CJK), params).fetchall()
+
+    # D. 子串命中（foods_trgm 三元组索引，替代前导通配 LIKE）
+    def _substring(self, cur, sq):
+        params = self._substring_params(sq)
+        if params is None:
+            return []
+        return cur.execute(sq.sql(SQL_SUBSTRING), params).fetchall()
+
+    def _substring_params(self, sq):
+        match = trigram_query(sq.q)
+        if not match or "foods_trgm" not in self._tables:
+            return None
+        return {"match": match, "limit": sq.limit, "tags": sq.tags}
+
+    # E. 拼写纠错（SymSpell 词级删除变体表，编辑距离 ≤ 2）
+    def _fuzzy(self, cur, sq):
+        if "fuzzy_words" not in self._tables:
+            return []
+        terms = self._fuzzy_terms(cur, sq.q)
+        if not terms:
+            return []
+        params = {"terms": json.dumps(terms), "limit": sq.limit, "tags": sq.tags}
+        return cur.execute(sq.sql(SQL_FOODS_BY_TERMS), params).fetchall()
+
+    def _fuzzy_terms(self, cur, q):
+        """
+        Phrases within edit distance of q, closest first. Each word of q is
+        corrected on its own against fuzzy_words (at most FUZZY_POOL known
+        words per word, pre-filtered by length in SQL), and the corrected
+        phrases within the total bound become candidate terms, at most
+        FUZZY_TERMS of them. A missing or extra space counts as one edit
+        when the split or joined words are known. The work depends on the
+        query and the word vocabulary, not on how many foods share a word.
+        """
+        words = q.split()
+        # 短词只允许 1 次编辑，避免 "tea" 匹配到一堆无关词
+        max_distance = 1 if len(" ".join(words)) <= 4 else MAX_EDIT_DISTANCE
+        near = [self._fuzzy_words(cur, w, max_distance) for w in words]
+        layouts = [(0, near)]
+        # 漏打 / 多打空格：拆开一个词或合并相邻两个词，算一次编辑
+        splits = {
+            (i, p): (w[:p], w[p:])
+            for i, w in enumerate(words)
+            for p in range(1, len(w))
+        }
+        merges = {i: words[i] + words[i + 1] for i in range(len(words) - 1)}
+        candidates = [w for pair in splits.values() for w in pair]
+        known = self._known_words(cur, candidates + list(merges.values()))
+        for (i, _), (a, b) in splits.items():
+            if a in known and b in known:
+                layouts.append((1, near[:i] + [[(0, a)], [(0, b)]] + near[i + 1 :]))
+        for i, merged in merges.items():
+            if merged in known:
+                layouts.append((1, near[:i] + [[(0, merged)]] + near[i + 2 :]))
 
-    # C. 模糊匹配（LIKE；简单可用）
-    rows = cur.execute(
+        scored = []
+
+        def walk(options, i, spent, picked):
+            if i == len(options):
+                term = " ".join(picked)
+                scored.append((spent, len(term), term))
+                return
+            for d, word in options[i]:
+                if spent + d > max_distance:
+                    break
+                walk(options, i + 1, spent + d, picked + [word])
+
+        for spent, options in layouts:
+            walk(options, 0, spent, [])
+        scored.sort()
+        return list(dict.fromkeys(term for _, _, term in scored))[:FUZZY_TERMS]
+
+    def _known_words(self, cur, words):
+        if not words:
+            return set()
+        params = {"words": json.dumps(sorted(set(words)))}
+        return {r[0] for r in cur.execute(SQL_KNOWN_WORDS, params)}
+
+    def _fuzzy_words(self, cur, word, max_distance):
+        """(distance, known word) pairs within the bound, closest first."""
+        bound = min(max_distance, 1 if len(word) <= 4 else MAX_EDIT_DISTANCE)
+        params = {
+            "variants": json.dumps(sorted(deletes(word, bound))),
+            "word": word,
+            "n": len(word),
+            "prefix": PREFIX_LENGTH,
+            "lo": len(word) - bound,
+            "hi": len(word) + bound,
+            "pool": FUZZY_POOL,
+        }
+        near = []
+        for (known,) in cur.execute(SQL_FUZZY_WORDS, params):
+            d = edit_distance(word, known, bound)
+            if d <= bound:
+                near.append((d, known))
+        near.sort()
+        return near
+
+    def suggest(self, q: str, k=3):
+        """
+        "Did you mean" for a query that found nothing: the k known aliases
+        and short names closest to q, by edit distance then popularity.
+        Candidates share a prefix variant with q in suggest_deletes; the
+        allowed distance grows with the query (a third of its length, at
+        least MAX_EDIT_DISTANCE) since anything closer was already tried
+        by the fuzzy stage.
         """
-        SELECT * FROM foods 
-        WHERE name LIKE ? OR short_name LIKE ?
-        LIMIT ?""",
-        (f"%{q}%", f"%{q}%", limit),
-    ).fetchall()
-    con.close()
-    return [dict(r) for r in rows]
+        q = " ".join(q.strip().lower().split())
+        if not q:
+            return []
+        max_distance = max(MAX_EDIT_DISTANCE, len(q) // 3)
+        n = len(q)
+        params = {
+            "variants": json.dumps(sorted(deletes(q))),
+            "n": n,
+            "prefix": PREFIX_LENGTH,
+        }
+        scored = []
+        bound = max_distance
+        budget = SUGGEST_POOL
+        with self._lock:
+            self._current_build()
+            if "suggest_deletes" not in self._tables:
+                return []
+            # 长度差是编辑距离的下界：由近到远逐档查询，各档共用 SUGGEST_POOL
+            # 个候选；凑满 k 个且下一档已比第 k 个更远时提前结束
+            for gap in range(max_distance + 1):
+                if budget <= 0 or (len(scored) == k and bound < gap):
+                    break
+                for length in sorted({n - gap, n + gap}):
+                    if length < 1 or budget <= 0:
+                        continue
+                    params.update(len=length, pool=budget)
+                    rows = self._con.execute(SQL_SUGGEST_TERMS, params).fetchall()
+                    budget -= len(rows)
+                    for term, popularity in rows:
+                        if bag_distance(q, term) > bound:
+                            continue
+                        d = edit_distance(q, term, bound)
+                        if d <= bound:
+                            scored.append(Suggestion(term, d, popularity))
+                            scored.sort(
+                                key=lambda s: (s.distance, -s.popularity, s.term)
+                            )
+                            del scored[k:]
+                            if len(scored) == k:
+                                bound = scored[-1].distance
+        return scored
+
+    # F. 兜底：LIKE 全表扫描（少于 3 个字符或旧库没有三元组索引时）
+    def _like(self, cur, sq):
+        params = self._like_params(sq)
+        if params is None:
+            return []
+        return cur.execute(sq.sql(SQL_LIKE), params).fetchall()
+
+    def _like_params(self, sq):
+        if trigram_query(sq.q) and "foods_trgm" in self._tables:
+            # 三元组阶段已经覆盖同样的子串，不再重复全表扫描
+            return None
+        if is_cjk(sq.q) and "foods_cjk" in self._tables:
+            # 纯中文查询的任意子串都已由 cjk 阶段的双字索引覆盖
+            return None
+        return {"pattern": f"%{sq.q}%", "limit": sq.limit, "tags": sq.tags}
+
+    # 可分页的阶段：(参数构造, keyset SQL)
+    @property
+    def _paged_stages(self):
+        return {
+            "fts": (self._fts_params, SQL_FTS_PAGE),
+            "substring": (self._substring_params, SQL_SUBSTRING_PAGE),
+            "like": (self._like_params, SQL_LIKE_PAGE),
+        }
+
+    def _page(self, cur, sq, stage, after):
+        make_params, template = self._paged_stages[stage]
+        params = make_params(sq)
+        if params is None:
+            return []
+        params["score"], params["rowid"] = after or (None, None)
+        return cur.execute(sq.sql(template), params).fetchall()
+
+    def classify(self, n: dict, strategy="conservative"):
+        return classify(n, strategy)
+
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+
+def default_engine() -> SearchEngine:
+    global _default_engine
+    if _default_engine is None:
+        with _default_lock:
+            if _default_engine is None:
+                _default_engine = SearchEngine()
+    return _default_engine
+
+
+def search_food(
+    q: str,
+    limit=5,
+    include_tags=(),
+    exclude_tags=(),
+    fields=None,
+    explain=False,
+    ranked=False,
+):
+    return default_engine().search(
+        q, limit, include_tags, exclude_tags, fields, explain, ranked
+    )
+
+
+def suggest(q: str, k=3):
+    return default_engine().suggest(q, k)
 
 
 if __name__ == "__main__":
     # demo
+    engine = default_engine()
+    fields = ("id", "name", "short_name", *NUTRIENT_FIELDS)
     for term in ["roti canai", "teh tarik", "waffle"]:
-        res = search_food(term, limit=3)
-        print("\n===", term, "===")
+        stage, res = engine.resolve(term, limit=3, fields=fields)
+        print("\n===", term, f"[{stage}]", "===")
         for r in res:
-            n = {
-                k: r[k]
-                for k in [
-                    "energy_kcal",
-                    "protein_g",
-                    "fat_g",
-                    "sat_fat_g",
-                    "carb_g",
-                    "sugar_g",
-                    "fiber_g",
-                    "sodium_mg",
-                ]
-            }
-            print(r["id"], r["short_name"] or r["name"], n, classify(n))
+            n = {k: r.get(k) for k in NUTRIENT_FIELDS}
+            print(r.id, r.short_name or r.name, n, classify(r))
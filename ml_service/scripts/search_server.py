@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""Local HTTP service around search_food (stdlib only).
+
+Endpoints:
+  GET  /search?q=roti+canai&limit=5&exclude=High+Sugar   ("did_you_mean" on a miss)
+  GET  /search?q=teh+tarik&ranked=1          blended top-k with scores
+  GET  /search_page?q=chicken&limit=20&cursor=<next_cursor>
+  GET  /search_many?q=roti&q=teh+tarik      POST {"queries": [...], "limit": 5}
+  GET  /food/<id>
+  GET  /classify?sugar_g=12&fat_g=3         POST {"sugar_g": 12, ...}
+  GET  /metrics                             Prometheus text format
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import signal
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from search_food import DB, ResultCache, SearchEngine, StageStats, classify
+
+MAX_LIMIT = 50
+# 所有引擎都忙时最多等这么久，之后返回 503
+CHECKOUT_TIMEOUT_S = 10.0
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def encode(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class EnginePool:
+    """Fixed set of SearchEngines shared by the handler threads of a process."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        size: int,
+        serving: bool = True,
+        memory: bool = False,
+        cache: bool = True,
+    ):
+        self._free: "queue.LifoQueue[SearchEngine]" = queue.LifoQueue()
+        # 所有引擎共用一份阶段耗时统计
+        self.stats = StageStats()
+        options = {} if cache else {"cache_size": 0}
+        for _ in range(size):
+            self._free.put(
+                SearchEngine(
+                    db_path,
+                    serving=serving,
+                    stats=self.stats,
+                    memory=memory,
+                    **options,
+                )
+            )
+
+    @contextmanager
+    def engine(self, timeout: float | None = None):
+        """Check out an engine; raises queue.Empty after `timeout` seconds."""
+        engine = self._free.get(timeout=timeout)
+        try:
+            yield engine
+        finally:
+            self._free.put(engine)
+
+
+class Metrics:
+    """Per-process request counters and latency histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.buckets: Dict[str, list] = {}
+        self.latency_sum: Dict[str, float] = {}
+
+    def observe(self, endpoint: str, status: int, ms: float) -> None:
+        with self._lock:
+            key = (endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            counts = self.buckets.setdefault(
+                endpoint, [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            )
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if ms <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self.latency_sum[endpoint] = self.latency_sum.get(endpoint, 0.0) + ms
+
+    def render(self, cache: ResultCache, stages: StageStats) -> bytes:
+        lines = [
+            "# TYPE search_requests_total counter",
+        ]
+        with self._lock:
+            for (endpoint, status), n in sorted(self.requests.items()):
+                lines.append(
+                    f'search_requests_total{{endpoint="{endpoint}",status="{status}"}} {n}'
+                )
+            lines.append("# TYPE search_latency_ms histogram")
+            for endpoint, counts in sorted(self.buckets.items()):
+                for bound, n in zip(LATENCY_BUCKETS_MS, counts):
+                    lines.append(
+                        f'search_latency_ms_bucket{{endpoint="{endpoint}",le="{bound}"}} {n}'
+                    )
+                lines.append(
+                    f'search_latency_ms_bucket{{endpoint="{endpoint}",le="+Inf"}} {counts[-1]}'
+                )
+                lines.append(
+                    f'search_latency_ms_sum{{endpoint="{endpoint}"}} {self.latency_sum[endpoint]:.3f}'
+                )
+                lines.append(
+                    f'search_latency_ms_count{{endpoint="{endpoint}"}} {counts[-1]}'
+                )
+        snapshot = stages.snapshot()
+        lines.append("# TYPE search_stage_latency_ms summary")
+        for stage, st in sorted(snapshot["stages"].items()):
+            for q in ("50", "95", "99"):
+                lines.append(
+                    f'search_stage_latency_ms{{stage="{stage}",quantile="0.{q}"}} '
+                    f"{st[f'p{q}_ms']:.4f}"
+                )
+            lines.append(
+                f'search_stage_latency_ms_sum{{stage="{stage}"}} '
+                f"{st['mean_ms'] * st['count']:.3f}"
+            )
+            lines.append(
+                f'search_stage_latency_ms_count{{stage="{stage}"}} {st["count"]}'
+            )
+            lines.append(f'search_stage_rows_total{{stage="{stage}"}} {st["rows"]}')
+        lines.append("# TYPE search_answered_total counter")
+        for stage, n in sorted(snapshot["answered"].items()):
+            lines.append(f'search_answered_total{{stage="{stage}"}} {n}')
+        lines.append("# TYPE search_response_cache gauge")
+        for name, value in cache.stats().items():
+            lines.append(f'search_response_cache{{stat="{name}"}} {value}')
+        lines.append(f"search_worker_pid {os.getpid()}")
+        return ("\n".join(lines) + "\n").encode()
+
+
+class SearchServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        address,
+        db_path=DB,
+        engines=4,
+        cache_size=4096,
+        serving=True,
+        memory=False,
+        cache=True,
+    ):
+        super().__init__(address, SearchHandler)
+        self.db_path = Path(db_path)
+        self.engines = engines
+        self.serving = serving
+        self.memory = memory
+        # cache=False 关掉响应缓存和引擎结果缓存，每个请求都落到 SQLite
+        self.cache_size = cache_size if cache else 0
+        self.cache = cache
+        self._pid = None
+        self._state_lock = threading.Lock()
+
+    def _ensure_state(self):
+        # 连接与缓存在 fork 之后、各进程内部创建
+        if self._pid != os.getpid():
+            with self._state_lock:
+                if self._pid != os.getpid():
+                    self._pool = None
+                    self.responses = ResultCache(self.cache_size)
+                    self.responses_lock = threading.Lock()
+                    self.metrics = Metrics()
+                    self._pid = os.getpid()
+
+    @property
+    def pool(self) -> EnginePool:
+        return self.open_pool()
+
+    def open_pool(self) -> EnginePool:
+        """This process's engines, opened on first use (memory=True copies the DB)."""
+        self._ensure_state()
+        if self._pool is None:
+            with self._state_lock:
+                # 打开失败时不缓存，下一个请求重试
+                if self._pool is None:
+                    self._pool = EnginePool(
+                        self.db_path,
+                        self.engines,
+                        self.serving,
+                        self.memory,
+                        self.cache,
+                    )
+        return self._pool
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # 头和 body 分两次写出；关闭 Nagle 避免 keep-alive 下 40ms 的延迟确认
+    disable_nagle_algorithm = True
+    server_version = "nutrition-search/0.1"
+    server: SearchServer
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        t0 = time.perf_counter()
+        url = urlsplit(self.path)
+        endpoint = url.path.rstrip("/") or "/"
+        if endpoint.startswith("/food/"):
+            endpoint = "/food"
+        self.server._ensure_state()  # metrics 在引擎打开失败时也要可用
+        try:
+            body = self._read_body()
+            pool = self._pool()
+            if endpoint == "/metrics":
+                status, payload = (
+                    200,
+                    self.server.metrics.render(self.server.responses, pool.stats),
+                )
+                self._send(status, payload, "text/plain; version=0.0.4")
+            else:
+                with pool.engine(CHECKOUT_TIMEOUT_S) as engine:
+                    status, payload = self._cached(engine, endpoint, url, body)
+                self._send(status, payload)
+        except HttpError as e:
+            status = e.status
+            self._send(status, encode({"error": str(e)}))
+        except queue.Empty:
+            status = 503
+            self._send(status, encode({"error": "all search engines are busy"}))
+        except ValueError as e:  # 例如未知的标签名
+            status = 400
+            self._send(status, encode({"error": str(e)}))
+        except Exception as e:  # noqa: BLE001 - report instead of dropping the socket
+            status = 500
+            self._send(status, encode({"error": str(e)}))
+        self.server.metrics.observe(endpoint, status, (time.perf_counter() - t0) * 1000)
+
+    def _read_body(self) -> bytes:
+        raw = self.headers.get("Content-Length") or "0"
+        try:
+            length = int(raw)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # 不知道 body 有多长，这条连接不能再复用
+            self.close_connection = True
+            raise HttpError(400, f"bad Content-Length {raw!r}")
+        return self.rfile.read(length) if length else b""
+
+    def _pool(self) -> EnginePool:
+        try:
+            return self.server.pool
+        except (OSError, sqlite3.Error) as e:
+            raise HttpError(503, f"search database unavailable: {e}") from None
+
+    def _cached(self, engine: SearchEngine, endpoint: str, url, body: bytes):
+        """Serve pre-serialized bytes for repeat requests on the same build."""
+        key = (engine.build_id(), self.command, url.path, url.query, body)
+        cacheable = key[0] is not None and endpoint != "/classify"
+        if cacheable:
+            with self.server.responses_lock:
+                hit = self.server.responses.get(key)
+            if hit is not None:
+                return 200, hit
+        payload = encode(self._handle(engine, endpoint, url, body))
+        if cacheable:
+            with self.server.responses_lock:
+                self.server.responses.put(key, payload)
+        return 200, payload
+
+    def _handle(self, engine: SearchEngine, endpoint: str, url, body: bytes):
+        params = parse_qs(url.query)
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise HttpError(400, "invalid JSON body") from None
+        if not isinstance(data, dict):
+            raise HttpError(400, "expected a JSON object")
+        if endpoint == "/search":
+            q = (params.get("q") or [""])[0]
+            if not q.strip():
+                raise HttpError(400, "missing q")
+            if (params.get("ranked") or ["0"])[0] not in ("", "0", "false"):
+                hits = engine.rank(
+                    q, self._limit(params, data), *self._tags(params, data)
+                )
+                return {
+                    "query": q,
+                    "stage": "ranked",
+                    "results": [
+                        {**h.food, "_score": h.score, "_sources": list(h.sources)}
+                        for h in hits
+                    ],
+                }
+            stage, rows = engine.resolve(
+                q, self._limit(params, data), *self._tags(params, data)
+            )
+            out = {"query": q, "stage": stage, "results": rows}
+            if stage is None:
+                out["did_you_mean"] = [s.term for s in engine.suggest(q)]
+            return out
+        if endpoint == "/search_page":
+            q = (params.get("q") or [""])[0]
+            if not q.strip():
+                raise HttpError(400, "missing q")
+            cursor = (params.get("cursor") or [None])[0]
+            stage, rows, next_cursor = engine.search_page(
+                q, self._limit(params, data), cursor, *self._tags(params, data)
+            )
+            return {
+                "query": q,
+                "stage": stage,
+                "results": rows,
+                "next_cursor": next_cursor,
+            }
+        if endpoint == "/search_many":
+            queries = data.get("queries") or params.get("q") or []
+            if not isinstance(queries, list) or not queries:
+                raise HttpError(400, "missing queries")
+            return {
+                "results": engine.search_many(
+                    [str(q) for q in queries],
+                    self._limit(params, data),
+                    *self._tags(params, data),
+                )
+            }
+        if endpoint == "/food":
+            food_id = unquote(url.path.split("/food/", 1)[1])
+            food = engine.food(food_id)
+            if food is None:
+                raise HttpError(404, f"unknown food {food_id}")
+            return {"food": food, "classification": classify(food)}
+        if endpoint == "/classify":
+            try:
+                return classify(data or {k: v[0] for k, v in params.items()})
+            except (TypeError, ValueError) as e:
+                raise HttpError(400, f"bad nutrient value: {e}") from None
+        raise HttpError(404, f"no route for {url.path}")
+
+    @staticmethod
+    def _tags(params, data):
+        """(include_tags, exclude_tags) from JSON lists or comma-separated params."""
+        out = []
+        for name in ("include", "exclude"):
+            values = data.get(name)
+            if values is None:
+                values = [t for v in params.get(name, []) for t in v.split(",")]
+            out.append(tuple(t.strip() for t in values if t.strip()))
+        return out
+
+    @staticmethod
+    def _limit(params, data) -> int:
+        raw = data.get("limit")
+        raw = raw if raw is not None else (params.get("limit") or [5])[0]
+        try:
+            return max(1, min(MAX_LIMIT, int(raw)))
+        except (TypeError, ValueError):
+            raise HttpError(400, f"bad limit {raw!r}") from None
+
+    def _send(self, status: int, payload: bytes, ctype="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(payload)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(
+    host: str,
+    port: int,
+    workers: int = 1,
+    db_path=DB,
+    engines: int = 4,
+    serving: bool = True,
+    memory: bool = False,
+    cache: bool = True,
+):
+    """
+    Serve on host:port. With workers > 1 the listening socket is bound once
+    and shared by `workers` forked processes, each with its own engines.
+    memory=True gives each worker one in-RAM copy of the DB for its engines;
+    cache=False turns off the response and result caches.
+    """
+    server = SearchServer(
+        (host, port),
+        db_path=db_path,
+        engines=engines,
+        serving=serving,
+        memory=memory,
+        cache=cache,
+    )
+    print(
+        f"🍜 Serving {db_path} on http://{host}:{server.server_port} ({workers} worker(s))"
+    )
+    if workers <= 1:
+        if memory:
+            server.open_pool()  # 启动时完成拷贝，而不是在第一个请求里
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                if memory:
+                    server.open_pool()
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(*_):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="forked processes")
+    parser.add_argument("--engines", type=int, default=4, help="connections per worker")
+    parser.add_argument("--db", type=Path, default=DB)
+    parser.add_argument(
+        "--read-write",
+        action="store_true",
+        help="open the DB normally instead of the read-only mmap serving mode",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="copy the DB into RAM at startup and serve every query from there",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="disable the response and result caches (for load tests)",
+    )
+    args = parser.parse_args(argv)
+    serve(
+        args.host,
+        args.port,
+        args.workers,
+        args.db,
+        args.engines,
+        serving=not args.read_write,
+        memory=args.memory,
+        cache=not args.no_cache,
+    )
+
+
+if __name__ == "__main__":
+    main()
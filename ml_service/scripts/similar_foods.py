@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Nutritionally similar foods: nearest neighbours over standardized nutrients."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from nutrient_store import NO_CATEGORY, NutrientStore, open_store, save_array, store_dir
+from search_food import DB, NUTRIENT_FIELDS, atomic_write
+
+
+def export_profiles(db_path=DB, store: NutrientStore | None = None) -> Path:
+    """
+    Write the standardized profiles next to the column store: z.npy
+    (fields x foods, 0 where unknown), each food's squared norm, its
+    known-field bitmask, and the rows grouped by category.
+    """
+    store = store or open_store(db_path)
+    out = store_dir(db_path)
+    x = np.stack([np.asarray(store.columns[f]) for f in NUTRIENT_FIELDS])
+    known = ~np.isnan(x)
+    # 均值 / 标准差只用已知值；整列缺失时退化为 0 / 1
+    count = np.maximum(known.sum(axis=1, keepdims=True), 1)
+    mean = np.where(known, x, 0).sum(axis=1, keepdims=True) / count
+    var = (np.where(known, x - mean, 0) ** 2).sum(axis=1, keepdims=True) / count
+    std = np.sqrt(var)
+    std = np.where(std > 0, std, 1.0)
+    z = np.where(known, (x - mean) / std, 0).astype(np.float32)
+    bits = (1 << np.arange(len(NUTRIENT_FIELDS), dtype=np.uint16))[:, None]
+    # 与列存一样逐个原子替换，profiles.json 最后写
+    save_array(out / "z.npy", z)
+    save_array(out / "z_norms.npy", (z * z).sum(axis=0))
+    save_array(out / "known_bits.npy", (known * bits).sum(axis=0).astype(np.uint8))
+
+    category = np.asarray(store.category)
+    order = np.argsort(category, kind="stable")
+    offsets = np.searchsorted(
+        category[order], np.arange(len(store.categories) + 1)
+    ).astype(np.int64)
+    save_array(out / "category_order.npy", order.astype(np.int64))
+    save_array(out / "category_offsets.npy", offsets)
+    with atomic_write(out / "profiles.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "build_id": store.build_id,
+                "fields": list(NUTRIENT_FIELDS),
+                "mean": mean[:, 0].tolist(),
+                "std": std[:, 0].tolist(),
+            },
+            f,
+        )
+    return out / "z.npy"
+
+
+class SimilarIndex:
+    """
+    Vectorized brute-force k-NN over standardized nutrient vectors.
+    Like classify(), a missing nutrient is unknown rather than zero: the
+    distance only uses fields known for both foods and is rescaled by
+    (fields / shared fields), NaN-Euclidean style. With z stored as 0 for
+    unknown fields that is ||z_S||² - 2 z·q + ||q_S||², i.e. one gemv over
+    the (fields x foods) matrix plus a 256-entry lookup on each food's
+    known-field bitmask for the query-side terms.
+    """
+
+    def __init__(self, db_path=DB):
+        self.store = open_store(db_path)
+        path = store_dir(db_path)
+        meta_path = path / "profiles.json"
+        fresh = False
+        if meta_path.exists() and (path / "z.npy").exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                fresh = json.load(f)["build_id"] == self.store.build_id
+        if not fresh:
+            export_profiles(db_path, self.store)
+        self.z = np.load(path / "z.npy", mmap_mode="r")
+        self.norms = np.load(path / "z_norms.npy", mmap_mode="r")
+        self.known = np.load(path / "known_bits.npy", mmap_mode="r")
+        self.category_order = np.load(path / "category_order.npy", mmap_mode="r")
+        self.category_offsets = np.load(path / "category_offsets.npy", mmap_mode="r")
+        self.dims = len(NUTRIENT_FIELDS)
+        # patterns × fields 的 0/1 矩阵，用来为每种已知字段组合算查询侧常数
+        patterns = np.arange(1 << self.dims)[:, None]
+        bits = (patterns >> np.arange(self.dims)) & 1
+        self._pattern_fields = bits.astype(np.float32)
+
+    def _pattern_terms(self, q: np.ndarray, m: np.ndarray) -> np.ndarray:
+        """
+        (256, 2) table per known-field bitmask: ||q_S||² over the shared
+        fields and the d / |S| rescale (inf distance when nothing is shared).
+        """
+        shared = self._pattern_fields * m
+        count = shared.sum(axis=1)
+        terms = np.empty((len(shared), 2), dtype=np.float32)
+        terms[:, 0] = np.where(count > 0, shared @ (q * q), np.inf)
+        terms[:, 1] = self.dims / np.maximum(count, 1)
+        return terms
+
+    def _candidates(self, row: int, same_category: bool):
+        if not same_category:
+            return None
+        code = int(self.store.category[row])
+        if code == NO_CATEGORY:
+            return None
+        lo, hi = self.category_offsets[code], self.category_offsets[code + 1]
+        return np.asarray(self.category_order[lo:hi])
+
+    def similar(
+        self, food_id: str, k: int = 5, same_category: bool = True
+    ) -> List[Tuple[str, float]]:
+        """
+        The k foods closest to `food_id`'s nutrient profile, nearest first,
+        as (food_id, distance in standard deviations). Foods sharing no
+        known nutrient with it are never returned.
+        """
+        row = self.store.row_of(food_id)
+        if row is None:
+            raise KeyError(food_id)
+        q = np.asarray(self.z[:, row])
+        m = self._pattern_fields[int(self.known[row])]
+        rows = self._candidates(row, same_category)
+        if rows is None:
+            z, norms, known = self.z, self.norms, self.known
+        else:
+            z, norms, known = self.z[:, rows], self.norms[rows], self.known[rows]
+
+        dist = np.multiply(q, -2.0, dtype=np.float32) @ z
+        dist += norms
+        for d in np.flatnonzero(m == 0):
+            # 查询未知的字段不参与距离：从 ||z||² 中扣掉
+            dist -= np.square(z[d])
+        terms = np.take(self._pattern_terms(q, m), known, axis=0)
+        dist += terms[:, 0]
+        dist *= terms[:, 1]
+
+        self_pos = row if rows is None else np.flatnonzero(rows == row)
+        dist[self_pos] = np.inf
+        k = min(k, len(dist))
+        if k <= 0:
+            return []
+        top = np.argpartition(dist, k - 1)[:k]
+        top = top[np.argsort(dist[top])]
+        top = top[np.isfinite(dist[top])]
+        hits = top if rows is None else rows[top]
+        dists = np.sqrt(np.maximum(dist[top], 0))
+        return list(zip(self.store.ids(hits), dists.tolist()))
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def similar(food_id: str, k: int = 5, same_category: bool = True):
+    global _default_index
+    if _default_index is None:
+        with _default_index_lock:
+            if _default_index is None:
+                _default_index = SimilarIndex()
+    return _default_index.similar(food_id, k, same_category)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("food_ids", nargs="*", default=["teh_tarik", "nasi_lemak"])
+    parser.add_argument("--db", type=Path, default=DB)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--any-category", action="store_true")
+    args = parser.parse_args(argv)
+
+    index = SimilarIndex(args.db)
+    for food_id in args.food_ids:
+        t0 = time.perf_counter()
+        try:
+            hits = index.similar(food_id, args.k, not args.any_category)
+        except KeyError:
+            print(f"\n=== {food_id}: unknown food ===")
+            continue
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"\n=== {food_id} ({ms:.3f} ms) ===")
+        for other, dist in hits:
+            print(f"  {dist:6.3f}  {other}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""In-memory prefix index for per-keystroke food autocomplete."""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import re
+import sqlite3
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from search_food import DB
+
+# 排序优先级：别名 > 简称 > 全名；本地整理 > MyFCD > 其他来源
+KIND_PRIORITY = {"alias": 0, "short_name": 1, "name": 2}
+SOURCE_PRIORITY = {"Curated": 0, "MyFCD": 1, "Nutritionix": 2, "OpenFoodFacts": 3}
+DEFAULT_SOURCE_PRIORITY = 4
+
+SQL_ALIAS_KEYS = """
+    SELECT a.alias, a.food_id, f.source
+    FROM alias AS a JOIN foods AS f ON f.id = a.food_id"""
+SQL_NAME_KEYS = "SELECT id, name, short_name, source FROM foods"
+
+
+def normalize_prefix(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index with precomputed top-k lists.
+    Every prefix up to `depth` characters keeps its best `top_k` food ids,
+    so short prefixes (the ones with huge candidate ranges) are one dict
+    lookup. Longer prefixes bisect the sorted key array and rank the
+    (small) matching range on the fly.
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[Tuple[str, str, str, str | None]],
+        top_k: int = 10,
+        depth: int = 4,
+    ):
+        """`entries` yields (key, food_id, kind, source) tuples."""
+        self.top_k = top_k
+        self.depth = depth
+        self.food_ids: List[str] = []
+        food_index: Dict[str, int] = {}
+
+        ranked = []
+        seen = set()
+        for key, food_id, kind, source in entries:
+            key = normalize_prefix(key or "")
+            if not key or (key, food_id) in seen:
+                continue
+            seen.add((key, food_id))
+            idx = food_index.get(food_id)
+            if idx is None:
+                idx = food_index[food_id] = len(self.food_ids)
+                self.food_ids.append(food_id)
+            score = (
+                KIND_PRIORITY[kind],
+                SOURCE_PRIORITY.get(source, DEFAULT_SOURCE_PRIORITY),
+                len(key),
+                key,
+            )
+            ranked.append((score, key, idx))
+        ranked.sort()
+
+        # rank = 全局排序位置；数值越小越靠前
+        order = sorted(range(len(ranked)), key=lambda i: ranked[i][1])
+        self.keys: List[str] = [ranked[i][1] for i in order]
+        self.foods = array("I", (ranked[i][2] for i in order))
+        self.ranks = array("I", order)
+
+        nodes: Dict[str, List[int]] = {}
+        # 第一轮：与前缀完全相同的键优先
+        for _, key, idx in ranked:
+            if len(key) <= depth:
+                self._push(nodes, key, idx)
+        for _, key, idx in ranked:
+            for n in range(1, min(depth, len(key)) + 1):
+                self._push(nodes, key[:n], idx)
+        self.nodes: Dict[str, Tuple[int, ...]] = {
+            p: tuple(ids) for p, ids in nodes.items()
+        }
+
+    def _push(self, nodes, prefix, idx):
+        ids = nodes.setdefault(prefix, [])
+        if len(ids) < self.top_k and idx not in ids:
+            ids.append(idx)
+
+    @classmethod
+    def from_db(cls, db_path=DB, top_k: int = 10, depth: int = 4) -> "PrefixIndex":
+        con = sqlite3.connect(db_path)
+        try:
+
+            def entries():
+                for alias, food_id, source in con.execute(SQL_ALIAS_KEYS):
+                    yield alias, food_id, "alias", source
+                for food_id, name, short, source in con.execute(SQL_NAME_KEYS):
+                    yield name, food_id, "name", source
+                    if short:
+                        yield short, food_id, "short_name", source
+
+            return cls(entries(), top_k=top_k, depth=depth)
+        finally:
+            con.close()
+
+    def complete(self, prefix: str, k: int = 5) -> List[str]:
+        prefix = normalize_prefix(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= self.depth and k <= self.top_k:
+            return [self.food_ids[i] for i in self.nodes.get(prefix, ())[:k]]
+
+        keys = self.keys
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + "\U0010ffff", lo)
+        # 完全相同的键排在区间开头，先取它们
+        exact = lo
+        while exact < hi and keys[exact] == prefix:
+            exact += 1
+        out: List[str] = []
+        for pos in sorted(range(lo, exact), key=self.ranks.__getitem__):
+            self._collect(out, pos, k)
+        if len(out) < k:
+            rest = heapq.nsmallest(k * 4, range(exact, hi), key=self.ranks.__getitem__)
+            for pos in rest:
+                self._collect(out, pos, k)
+        return out
+
+    def _collect(self, out, pos, k):
+        food_id = self.food_ids[self.foods[pos]]
+        if len(out) < k and food_id not in out:
+            out.append(food_id)
+
+    def memory_footprint(self) -> Dict[str, int]:
+        """Approximate bytes held by each structure (containers + contents)."""
+        keys = sys.getsizeof(self.keys) + sum(map(sys.getsizeof, self.keys))
+        ids = sys.getsizeof(self.food_ids) + sum(map(sys.getsizeof, self.food_ids))
+        nodes = sys.getsizeof(self.nodes) + sum(
+            sys.getsizeof(p) + sys.getsizeof(t) for p, t in self.nodes.items()
+        )
+        arrays = sys.getsizeof(self.foods) + sys.getsizeof(self.ranks)
+        return {
+            "keys": keys,
+            "food_ids": ids,
+            "postings": arrays,
+            "prefix_nodes": nodes,
+            "total": keys + ids + arrays + nodes,
+        }
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("prefixes", nargs="*", default=["r", "ro", "roti c", "teh"])
+    parser.add_argument("--db", type=Path, default=DB)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    index = PrefixIndex.from_db(args.db)
+    print(
+        f"⌨️  Loaded {len(index.keys):,} keys / {len(index.nodes):,} prefix nodes "
+        f"in {time.perf_counter() - t0:.2f}s"
+    )
+    for name, size in index.memory_footprint().items():
+        print(f"{name:>13}: {size / 1024 / 1024:8.2f} MiB")
+    for prefix in args.prefixes:
+        t0 = time.perf_counter()
+        hits = index.complete(prefix, args.k)
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"\n=== {prefix!r} ({ms:.3f} ms) ===")
+        for food_id in hits:
+            print(" ", food_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Fixtures: small nutrition.db catalogs built with the real build code."""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+import build_nutrition_db as build
+import pytest
+
+INSERT_FOOD = """INSERT OR REPLACE INTO foods
+(id,name,short_name,category,quantity,brands,food_groups,energy_kcal,protein_g,fat_g,sat_fat_g,carb_g,sugar_g,fiber_g,sodium_mg,source)
+VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+
+
+def write_catalog(path: Path, items) -> Path:
+    """
+    (Re)build `path` from curated-style items the same way build_nutrition_db
+    does: schema, rows, aliases and every index in a temp file, which then
+    replaces `path`.
+    """
+    tmp = build.build_path(path)
+    tmp.unlink(missing_ok=True)
+    con = sqlite3.connect(tmp)
+    cur = con.cursor()
+    build.create_schema(cur)
+    rows, alias_rows = [], []
+    for item in items:
+        row, aliases = build.prepare_curated_entry(item, item.get("source", "Test"))
+        rows.append(row)
+        alias_rows.extend(aliases)
+    cur.executemany(INSERT_FOOD, rows)
+    cur.executemany(
+        "INSERT OR REPLACE INTO alias(alias, food_id) VALUES(?,?)", alias_rows
+    )
+    build.rebuild_search_indexes(cur)
+    con.commit()
+    con.close()
+    os.replace(tmp, path)
+    return path
+
+
+def food(food_id: str, name: str, aliases=(), **nutrients) -> dict:
+    return {
+        "id": food_id,
+        "name": name,
+        "aliases": list(aliases),
+        "category": nutrients.pop("category", None),
+        "nutrients_per_100g": nutrients,
+    }
+
+
+@pytest.fixture
+def make_catalog(tmp_path):
+    """make_catalog(items) -> path; calling it again rebuilds the same file."""
+
+    def make(items, name="nutrition.db"):
+        return write_catalog(tmp_path / name, items)
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def curated_db(tmp_path_factory) -> Path:
+    """The curated JSON (local additions + MyFCD) built like the real DB."""
+    path = tmp_path_factory.mktemp("curated") / "nutrition.db"
+    with open(build.CUR / "local_additions.json", "r", encoding="utf-8") as f:
+        local = json.load(f)
+    with open(build.CUR / "myfcd_clean.json", "r", encoding="utf-8") as f:
+        # 与 build_nutrition_db.main 一样加 myfcd- 前缀
+        myfcd = [
+            {**it, "id": f"myfcd-{it['id']}", "source": "MyFCD"} for it in json.load(f)
+        ]
+    return write_catalog(path, local + myfcd)
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import pytest
+from async_search import AsyncSearchEngine, SearchOverloaded
+from conftest import food
+from search_food import SearchEngine
+
+
+def test_timed_out_call_keeps_its_slot(make_catalog, monkeypatch):
+    """A slot is only freed when the worker finishes, not when the caller gives up."""
+    db = make_catalog([food("teh_tarik", "Teh Tarik", sugar_g=8)])
+    release = threading.Event()
+    real = SearchEngine.search
+
+    def slow(self, *args):
+        release.wait(5)
+        return real(self, *args)
+
+    monkeypatch.setattr(SearchEngine, "search", slow)
+
+    async def run():
+        async with AsyncSearchEngine(
+            db, workers=2, max_pending=1, reject=True
+        ) as engine:
+            with pytest.raises(asyncio.TimeoutError):
+                await engine.search("teh tarik", timeout=0.05)
+            # 调用方已超时，但工作线程还在跑：背压仍然生效
+            assert engine.pending == 1
+            with pytest.raises(SearchOverloaded):
+                await engine.search("teh tarik")
+
+            release.set()
+            for _ in range(200):
+                if not engine.pending:
+                    break
+                await asyncio.sleep(0.01)
+            assert engine.pending == 0
+            rows = await engine.search("teh tarik", timeout=5)
+            assert rows[0]["id"] == "teh_tarik"
+
+    asyncio.run(run())
+
+
+def test_slots_return_after_burst(make_catalog):
+    db = make_catalog([food("teh_tarik", "Teh Tarik", sugar_g=8)])
+
+    async def run():
+        async with AsyncSearchEngine(db, workers=1, max_pending=2) as engine:
+            results = await asyncio.gather(
+                *(engine.search("teh tarik") for _ in range(6))
+            )
+            assert all(rows[0]["id"] == "teh_tarik" for rows in results)
+            assert engine.pending == 0
+            assert not engine._slots.locked()
+
+    asyncio.run(run())
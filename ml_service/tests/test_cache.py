@@ -0,0 +1,99 @@
+"""Rebuilding nutrition.db under a live engine drops its cached results."""
+
+import sqlite3
+import threading
+
+import pytest
+from conftest import food
+from search_food import SearchEngine
+
+MODES = {"default": {}, "serving": {"serving": True}, "memory": {"memory": True}}
+
+
+def teh_tarik(sugar):
+    return [
+        food("teh_tarik", "Teh Tarik", ["milk tea"], sugar_g=sugar),
+        food("roti_canai", "Roti Canai", fat_g=12),
+    ]
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_rebuild_drops_cache(make_catalog, mode):
+    db = make_catalog(teh_tarik(10.0))
+    with SearchEngine(db, **MODES[mode]) as engine:
+        first = engine.build_id()
+        assert first is not None
+        assert engine.search("teh tarik")[0]["sugar_g"] == 10.0
+        assert engine.search("teh tarik")[0]["sugar_g"] == 10.0
+        assert engine.cache.stats()["hits"] == 1
+
+        # 与 build_nutrition_db 一样：新文件写好后替换同一路径
+        make_catalog(teh_tarik(14.0) + [food("teh_o", "Teh O", sugar_g=6)])
+        assert engine.build_id() != first
+        assert engine.cache.stats()["size"] == 0
+        assert engine.search("teh tarik")[0]["sugar_g"] == 14.0
+        assert engine.search("teh o")[0]["id"] == "teh_o"
+        assert engine.cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_rank_cache_follows_build(make_catalog, mode):
+    db = make_catalog(teh_tarik(10.0))
+    with SearchEngine(db, **MODES[mode]) as engine:
+        assert [h.food["sugar_g"] for h in engine.rank("milk tea")] == [10.0]
+        make_catalog(teh_tarik(14.0))
+        assert [h.food["sugar_g"] for h in engine.rank("milk tea")] == [14.0]
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_rebuild_under_concurrent_readers(make_catalog, mode):
+    """Repeated builds while engines query the same path never raise."""
+    db = make_catalog(teh_tarik(10.0))
+    errors, stop = [], threading.Event()
+
+    def reader():
+        with SearchEngine(db, **MODES[mode]) as engine:
+            while not stop.is_set():
+                try:
+                    rows = engine.search("teh tarik")
+                    assert rows and rows[0]["sugar_g"] in (10.0, 14.0)
+                    engine.search("tarik")
+                except Exception as e:  # noqa: BLE001 - collected for the assert
+                    errors.append(repr(e))
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for t in threads:
+        t.start()
+    try:
+        for i in range(30):
+            make_catalog(teh_tarik(14.0 if i % 2 else 10.0))
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    assert errors == []
+
+
+def test_schema_change_under_live_engine(make_catalog):
+    db = make_catalog(teh_tarik(10.0))
+    # WAL 下其他连接的提交不改动主文件，只有 data_version 会变
+    con = sqlite3.connect(db)
+    con.execute("PRAGMA journal_mode = WAL")
+    fields = ("id", "brands")
+    with SearchEngine(db, cache_size=0) as engine:
+        assert engine.resolve("teh-tarik")[0] == "norm"
+        assert engine.resolve("teh tarik", fields=fields)[1][0].id == "teh_tarik"
+
+        # 原地去掉一张表、改掉一列（build_id 不变）
+        with con:
+            con.execute("ALTER TABLE alias_norm RENAME TO alias_norm_old")
+            con.execute("ALTER TABLE foods RENAME COLUMN brands TO brand")
+        assert engine.resolve("teh tarik", fields=fields)[1][0].brands is None
+        stage, rows = engine.resolve("teh-tarik")
+        assert stage != "norm" and rows[0]["id"] == "teh_tarik"
+
+        # 再加回来：新出现的表同样会被用上
+        with con:
+            con.execute("ALTER TABLE alias_norm_old RENAME TO alias_norm")
+        assert engine.resolve("teh-tarik")[0] == "norm"
+    con.close()
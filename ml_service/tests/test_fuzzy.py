@@ -0,0 +1,101 @@
+import pytest
+import search_food
+from conftest import food
+from search_food import FUZZY_POOL, FUZZY_TERMS, SearchEngine
+
+FLAVOURS = [
+    "cheese",
+    "onion",
+    "chocolate",
+    "vanilla",
+    "strawberry",
+    "durian",
+    "pandan",
+    "salted",
+]
+PRODUCTS = ["biscuits", "wafers", "cookies", "snacks", "sticks", "rolls"]
+
+
+def brand_family(n):
+    """n foods sharing the brand prefix, plus the one the typo should find."""
+    items = [
+        food(
+            f"m{i}",
+            f"Mondelez {FLAVOURS[i % 8]} {PRODUCTS[i // 8 % 6]} {i}",
+            sugar_g=10,
+        )
+        for i in range(n)
+    ]
+    items.append(food("crackers", "Mondelez Yogurt Crackers", sugar_g=12))
+    items.append(food("teh_tarik", "Teh Tarik", ["milk tea"], sugar_g=8))
+    return items
+
+
+@pytest.fixture
+def count_distance(monkeypatch):
+    calls = []
+    real = search_food.edit_distance
+
+    def counted(a, b, max_distance=search_food.MAX_EDIT_DISTANCE):
+        calls.append(b)
+        return real(a, b, max_distance)
+
+    monkeypatch.setattr(search_food, "edit_distance", counted)
+    return calls
+
+
+def test_fuzzy_finds_typos(make_catalog):
+    with SearchEngine(make_catalog(brand_family(50)), cache_size=0) as engine:
+        stage, rows = engine.resolve("mondelez yogurt cracekrs")
+        assert stage == "fuzzy" and [r["id"] for r in rows] == ["crackers"]
+        stage, rows = engine.resolve("teh trik")
+        assert stage == "fuzzy" and rows[0]["id"] == "teh_tarik"
+        # 漏打 / 多打空格
+        assert engine.resolve("tehtarik")[1][0]["id"] == "teh_tarik"
+        assert engine.resolve("teh ta rik")[1][0]["id"] == "teh_tarik"
+        # 短词只允许 1 次编辑
+        assert engine.resolve("mlk tea")[1][0]["id"] == "teh_tarik"
+        assert engine.resolve("xyzzy")[0] is None
+
+
+def test_fuzzy_candidates_bounded(make_catalog, count_distance):
+    """Verified candidates depend on the query, not on the brand's row count."""
+    counts = []
+    for n in (100, 3000):
+        path = make_catalog(brand_family(n), name=f"catalog-{n}.db")
+        with SearchEngine(path, cache_size=0) as engine:
+            count_distance.clear()
+            terms = engine._fuzzy_terms(
+                engine._con.cursor(), "mondelez yogurt cracekrs"
+            )
+            assert "mondelez yogurt crackers" in terms
+            assert len(terms) <= FUZZY_TERMS
+            counts.append(len(count_distance))
+    assert counts[0] == counts[1]
+    assert counts[1] <= 3 * FUZZY_POOL
+
+
+def near_teh(n):
+    """n three-letter words sharing a one-delete variant with "teh", in order."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = sorted(
+        {
+            pair[:i] + c + pair[i:]
+            for pair in ("eh", "th", "te")
+            for i in range(3)
+            for c in letters
+        }
+        - {"teh"}
+    )
+    return words[:n]
+
+
+@pytest.mark.parametrize("n", [75, 150])
+def test_fuzzy_dense_vocabulary_keeps_exact_word(make_catalog, n):
+    """A known word is never cut from its own candidate list by its neighbours."""
+    items = [food(f"w{i}", f"{w} special") for i, w in enumerate(near_teh(n))]
+    items.append(food("teh_tarik", "Teh Tarik", sugar_g=8))
+    with SearchEngine(make_catalog(items), cache_size=0) as engine:
+        for q in ("teh trik", "teh tarek"):
+            stage, rows = engine.resolve(q)
+            assert stage == "fuzzy" and rows[0]["id"] == "teh_tarik", q
@@ -0,0 +1,106 @@
+import itertools
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import food
+from health_tags import classify_batch, decode_masks
+from search_food import DEFAULT_RULES, RULES, SearchEngine, classify, load_tag_rules
+
+FIELDS = ("sugar_g", "fat_g", "fiber_g", "sodium_mg")
+
+
+def test_rules_come_from_thresholds():
+    assert RULES == load_tag_rules()
+
+
+def borderline():
+    # 旧默认阈值 20/17/3/600 下全部超标，配置文件的 22/18/3/700 下都不算
+    return {"sugar_g": 21.0, "fat_g": 17.5, "fiber_g": 4.0, "sodium_mg": 650.0}
+
+
+def test_thresholds_file_changes_classification(make_catalog):
+    assert (RULES["high_sugar_g"], RULES["high_fat_g"]) == (22, 18)
+    assert (RULES["low_fiber_g"], RULES["high_sodium_mg"]) == (3, 700)
+    columns = {f: [v] for f, v in borderline().items()}
+    old = decode_masks(*classify_batch(columns, DEFAULT_RULES))[0]
+    assert old["tags"] == ["High Sugar", "High Fat", "High Sodium", "Unbalanced"]
+    assert classify(borderline())["tags"] == []
+
+    db = make_catalog([food("kuih", "Kuih Lapis", **borderline())])
+    with SearchEngine(db, cache_size=0) as engine:
+        _, rows = engine.resolve("kuih", exclude_tags=["High Sodium"])
+        assert [r["id"] for r in rows] == ["kuih"]
+        _, rows = engine.resolve("kuih", include_tags=["High Sugar"])
+        assert rows == []
+
+
+def test_stale_tag_rules_rejected(make_catalog):
+    db = make_catalog([food("kuih", "Kuih Lapis", **borderline())])
+    con = sqlite3.connect(db)
+    with con:
+        # 模拟用旧阈值构建的库
+        con.execute(
+            "UPDATE meta SET value = ? WHERE key = 'tag_rules'",
+            (json.dumps(DEFAULT_RULES),),
+        )
+    con.close()
+    with SearchEngine(db, cache_size=0) as engine:
+        assert engine.resolve("kuih")[1]
+        with pytest.raises(ValueError, match="thresholds"):
+            engine.resolve("kuih", exclude_tags=["High Sodium"])
+
+
+def test_stored_masks_match_classify(curated_db):
+    """tag_mask / unknown_mask written by the build == classify() on every row."""
+    con = sqlite3.connect(curated_db)
+    rows = con.execute(
+        f"SELECT id, tag_mask, unknown_mask, {', '.join(FIELDS)} FROM foods"
+    ).fetchall()
+    con.close()
+    decoded = decode_masks(
+        np.array([r[1] for r in rows]), np.array([r[2] for r in rows])
+    )
+    for row, stored in zip(rows, decoded):
+        assert stored == classify(dict(zip(FIELDS, row[3:]))), row[0]
+
+
+def test_tag_filter_agrees_with_food(curated_db):
+    with SearchEngine(curated_db, cache_size=0) as engine:
+        _, rows = engine.resolve("nasi", exclude_tags=["High Sodium"], limit=200)
+        assert rows
+        for row in rows:
+            # /food 用 classify(food) 给出的标签
+            assert "High Sodium" not in classify(engine.food(row["id"]))["tags"]
+
+
+def nutrient_grid():
+    """Every field at None / NaN / 0 / exactly its threshold / just past it."""
+    limits = {
+        "sugar_g": RULES["high_sugar_g"],
+        "fat_g": RULES["high_fat_g"],
+        "fiber_g": RULES["low_fiber_g"],
+        "sodium_mg": RULES["high_sodium_mg"],
+    }
+    values = {
+        f: [None, float("nan"), 0.0, v, v - 0.5, v + 0.5] for f, v in limits.items()
+    }
+    return [dict(zip(FIELDS, combo)) for combo in itertools.product(*values.values())]
+
+
+def test_classify_batch_matches_classify():
+    rows = nutrient_grid()
+    columns = {f: [r[f] for r in rows] for f in FIELDS}
+    tags, unknown = classify_batch(columns)
+    assert decode_masks(tags, unknown) == [classify(r) for r in rows]
+
+
+def test_classify_batch_dataframe(curated_db):
+    con = sqlite3.connect(curated_db)
+    df = pd.read_sql_query(f"SELECT {', '.join(FIELDS)} FROM foods", con)
+    con.close()
+    assert df.isna().any().any()  # 含缺失值
+    tags, unknown = classify_batch(df)
+    assert decode_masks(tags, unknown) == [classify(r) for r in df.to_dict("records")]
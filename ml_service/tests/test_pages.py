@@ -0,0 +1,58 @@
+import pytest
+from conftest import food
+from search_food import SearchEngine
+
+FLAVOURS = ["susu", "ais", "o", "peng", "cham", "halia"]
+
+
+def kopi_menu(n=57):
+    """n kopi drinks; every third one is High Sugar."""
+    items = [
+        food(f"k{i}", f"Kopi {FLAVOURS[i % 6]} {i}", sugar_g=25 if i % 3 else 5)
+        for i in range(n)
+    ]
+    items.append(food("teh_tarik", "Teh Tarik", sugar_g=8))
+    return items
+
+
+def all_pages(engine, q, limit, **tags):
+    stages, ids, cursor = set(), [], None
+    while True:
+        stage, rows, cursor = engine.search_page(q, limit, cursor, **tags)
+        stages.add(stage)
+        ids += [r["id"] for r in rows]
+        if cursor is None:
+            return stages, ids
+
+
+@pytest.mark.parametrize(
+    "q, stage", [("kopi", "fts"), ("opi", "substring"), ("op", "like")]
+)
+@pytest.mark.parametrize("limit", [7, 19])
+@pytest.mark.parametrize("tags", [{}, {"exclude_tags": ["High Sugar"]}])
+def test_pages_cover_resolve(make_catalog, q, stage, limit, tags):
+    with SearchEngine(make_catalog(kopi_menu()), cache_size=0) as engine:
+        full_stage, full = engine.resolve(q, limit=1000, **tags)
+        assert full_stage == stage and len(full) >= limit
+        stages, ids = all_pages(engine, q, limit, **tags)
+        assert stages == {stage}
+        assert len(ids) == len(set(ids))
+        assert sorted(ids) == sorted(r["id"] for r in full)
+
+
+def test_foreign_cursor_rejected(make_catalog):
+    db = make_catalog(kopi_menu())
+    with SearchEngine(db) as engine:
+        _, _, cursor = engine.search_page("kopi", 5)
+        assert cursor is not None
+        with pytest.raises(ValueError):
+            engine.search_page("kopi susu", 5, cursor)
+        with pytest.raises(ValueError):
+            engine.search_page("kopi", 5, cursor, exclude_tags=["High Sugar"])
+        with pytest.raises(ValueError):
+            engine.search_page("kopi", 5, "not-a-cursor")
+        engine.search_page("kopi", 5, cursor)
+
+        make_catalog(kopi_menu(40))
+        with pytest.raises(ValueError, match="build"):
+            engine.search_page("kopi", 5, cursor)
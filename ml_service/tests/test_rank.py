@@ -0,0 +1,21 @@
+from conftest import food
+from search_food import RANK_POOL, SearchEngine
+
+
+def chicken_menu(n=80):
+    items = [food(f"cr{i}", f"Chicken rice {i}", sugar_g=30) for i in range(n)]
+    items.append(food("floss", "Chicken floss plain", sugar_g=4))
+    return items
+
+
+def test_rank_filters_tags_before_pool(make_catalog):
+    """Excluded rows must not use up a source's LIMIT :pool candidates."""
+    with SearchEngine(make_catalog(chicken_menu()), cache_size=0) as engine:
+        assert len(engine.rank("chicken", limit=100)) > RANK_POOL
+        staged = engine.search("chicken", exclude_tags=["High Sugar"])
+        ranked = engine.rank("chicken", exclude_tags=["High Sugar"])
+        assert [r["id"] for r in staged] == ["floss"]
+        assert [h.food["id"] for h in ranked] == ["floss"]
+        included = engine.rank("chicken rice", limit=10, include_tags=["High Sugar"])
+        assert len(included) == 10
+        assert all(h.food["id"].startswith("cr") for h in included)
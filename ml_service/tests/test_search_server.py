@@ -0,0 +1,70 @@
+import http.client
+import json
+import threading
+
+import pytest
+import search_server
+from conftest import food
+from search_server import SearchServer
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(db, **kwargs):
+        server = SearchServer(("127.0.0.1", 0), db_path=db, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    con = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=10)
+    try:
+        con.request(method, path, body, headers or {})
+        res = con.getresponse()
+        return res.status, json.loads(res.read())
+    finally:
+        con.close()
+
+
+def test_bad_content_length_is_400(make_catalog, start_server):
+    server = start_server(make_catalog([food("teh_tarik", "Teh Tarik")]))
+    for length in ("abc", "-5"):
+        status, body = request(
+            server, "POST", "/search_many", b"{}", {"Content-Length": length}
+        )
+        assert status == 400 and "Content-Length" in body["error"]
+    status, body = request(server, "GET", "/search?q=teh+tarik")
+    assert status == 200 and body["results"][0]["id"] == "teh_tarik"
+
+
+def test_unavailable_db_is_503(tmp_path, start_server):
+    server = start_server(tmp_path / "missing.db")
+    status, body = request(server, "GET", "/search?q=teh+tarik")
+    assert status == 503 and "unavailable" in body["error"]
+
+
+def test_busy_pool_is_503(make_catalog, start_server, monkeypatch):
+    monkeypatch.setattr(search_server, "CHECKOUT_TIMEOUT_S", 0.05)
+    server = start_server(make_catalog([food("teh_tarik", "Teh Tarik")]), engines=1)
+    with server.open_pool().engine():
+        status, body = request(server, "GET", "/search?q=teh+tarik")
+    assert status == 503 and "busy" in body["error"]
+    assert request(server, "GET", "/search?q=teh+tarik")[0] == 200
+
+
+def test_no_cache_reaches_sqlite_every_time(make_catalog, start_server):
+    server = start_server(make_catalog([food("teh_tarik", "Teh Tarik")]), cache=False)
+    for _ in range(3):
+        status, body = request(server, "GET", "/search?q=teh+tarik")
+        assert status == 200 and body["results"][0]["id"] == "teh_tarik"
+    assert server.responses.stats()["size"] == 0
+    with server.open_pool().engine() as engine:
+        assert engine.cache.stats()["size"] == 0
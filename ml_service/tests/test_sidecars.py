@@ -0,0 +1,131 @@
+"""mmap sidecars next to nutrition.db: atomic re-export under live readers."""
+
+import hashlib
+
+import numpy as np
+import pytest
+from conftest import food
+from embed_foods import SemanticIndex, build_embeddings, embedding_paths, load_index
+from name_match import NameMatcher, build_sidecar, load_matcher
+from nutrient_store import NutrientStore, export_columns, open_store, store_dir
+from similar_foods import SimilarIndex
+
+
+def catalog(protein):
+    return [
+        food(
+            "chicken", "Chicken Breast", protein_g=protein, fat_g=3.6, category="meat"
+        ),
+        food("rice", "White Rice", protein_g=2.7, fat_g=0.3, category="rice"),
+        food("tofu", "Tofu", protein_g=8.1, fat_g=4.8),
+    ]
+
+
+def leftovers(path):
+    return [p.name for p in path.iterdir() if p.name.endswith(".tmp")]
+
+
+def test_columns_reexport_keeps_old_mmaps(make_catalog):
+    db = make_catalog(catalog(31.0))
+    old = open_store(db)
+    assert old.query("protein_g > 20").ids == ["chicken"]
+
+    make_catalog(catalog(12.0) + [food("tempeh", "Tempeh", protein_g=20.3)])
+    new = open_store(db)
+    assert new.build_id != old.build_id and new.rows == 4
+    assert new.query("protein_g > 20").ids == ["tempeh"]
+    # 旧 store 仍映射着被替换掉的文件，读取不会 SIGBUS，数据保持旧版本
+    assert old.query("protein_g > 20").ids == ["chicken"]
+    assert np.asarray(old.columns["protein_g"]).tolist() == pytest.approx(
+        [31.0, 2.7, 8.1]
+    )
+    assert leftovers(store_dir(db)) == []
+
+
+def test_open_store_checks_build_id_first(make_catalog, monkeypatch):
+    db = make_catalog(catalog(31.0))
+    export_columns(db)
+    make_catalog(catalog(12.0))
+    opened = []
+    real_init = NutrientStore.__init__
+
+    def counted(self, db_path):
+        opened.append(db_path)
+        real_init(self, db_path)
+
+    monkeypatch.setattr(NutrientStore, "__init__", counted)
+    store = open_store(db)
+    # 过期的列文件不被打开：只在重新导出之后加载一次
+    assert len(opened) == 1
+    assert store.query("protein_g > 20").ids == []
+
+
+def test_profiles_reexport_keeps_old_mmaps(make_catalog):
+    db = make_catalog(catalog(31.0))
+    old = SimilarIndex(db)
+    before = np.array(old.z)
+    ranked = old.similar("chicken", same_category=False)
+
+    make_catalog(catalog(12.0) + [food("tempeh", "Tempeh", protein_g=20.3)])
+    new = SimilarIndex(db)
+    assert new.z.shape[1] == 4
+    assert "tempeh" in [f for f, _ in new.similar("chicken", same_category=False)]
+    np.testing.assert_array_equal(old.z, before)
+    assert old.similar("chicken", same_category=False) == ranked
+    assert leftovers(store_dir(db)) == []
+
+
+def test_names_sidecar_failed_save_keeps_old(make_catalog, monkeypatch):
+    db = make_catalog(catalog(31.0))
+    path = build_sidecar(db)
+    old_build = NameMatcher.load(path).build_id
+
+    make_catalog(catalog(12.0) + [food("tempeh", "Tempeh", protein_g=20.3)])
+
+    def interrupted(f, **arrays):
+        f.write(b"PK\x03\x04 half an archive")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(np, "savez_compressed", interrupted)
+    with pytest.raises(OSError, match="disk full"):
+        build_sidecar(db)
+    # 旧 sidecar 原样保留，也没有残留的临时文件
+    assert NameMatcher.load(path).build_id == old_build
+    assert leftovers(path.parent) == []
+
+    monkeypatch.undo()
+    matcher = load_matcher(db)
+    assert matcher.build_id != old_build
+    assert matcher.match_names(["tempeh"], k=1)[0][0][0] == "tempeh"
+
+
+class HashEncoder:
+    """Deterministic bag-of-words vectors via build_embeddings(encoder=...)."""
+
+    model_name = "test-hash"
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), 64), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().replace(";", " ").split():
+                out[i, hashlib.md5(word.encode()).digest()[0] % 64] += 1
+        return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+
+
+def test_embeddings_rejected_after_rebuild(make_catalog):
+    db = make_catalog(catalog(31.0))
+    encoder = HashEncoder()
+    build_embeddings(db, encoder=encoder, n_lists=2)
+    old = SemanticIndex(db, encoder)
+    assert old.centroids is not None
+    assert old.search("chicken breast", k=1)[0][0] == "chicken"
+
+    make_catalog(catalog(12.0) + [food("tempeh", "Tempeh", protein_g=20.3)])
+    with pytest.raises(ValueError, match="build"):
+        SemanticIndex(db, encoder)
+    new = load_index(db, encoder)
+    assert new.build_id != old.build_id and len(new.ids) == 4
+    assert new.centroids is not None  # 按原簇数重建
+    assert new.search("tempeh", k=1)[0][0] == "tempeh"
+    assert old.search("chicken breast", k=1)[0][0] == "chicken"
+    assert leftovers(embedding_paths(db)[0].parent) == []
@@ -0,0 +1,35 @@
+import itertools
+
+import pytest
+from conftest import food
+from search_food import SUGGEST_POOL, SearchEngine
+
+
+def popular_chicken(n):
+    """n popular "chicken xxxxxx" dishes (two foods each) and one plain porridge."""
+    words = ("".join(p) for p in itertools.product("bdfgkmptvz", repeat=6))
+    items = []
+    for i, word in zip(range(n), words):
+        items.append(food(f"c{i}a", f"Chicken {word}"))
+        items.append(food(f"c{i}b", f"Chicken {word}"))
+    items.append(food("porridge", "Chicken Porridge"))
+    return items
+
+
+@pytest.mark.parametrize("n", [50, SUGGEST_POOL + 200])
+def test_suggest_keeps_near_term_under_common_prefix(make_catalog, n):
+    with SearchEngine(make_catalog(popular_chicken(n)), cache_size=0) as engine:
+        hits = engine.suggest("chicken porridgx")
+        assert hits and hits[0].term == "chicken porridge"
+        assert hits[0].distance == 1
+
+
+def test_suggest_prefers_popular_at_equal_distance(make_catalog):
+    items = [
+        food("mee_goreng", "Mee Goreng"),
+        food("mee_goreng_2", "Mee Goreng"),
+        food("mee_gorenx", "Mee Gorenx"),
+    ]
+    with SearchEngine(make_catalog(items), cache_size=0) as engine:
+        hits = engine.suggest("mee gorenq", k=2)
+        assert [h.term for h in hits] == ["mee goreng", "mee gorenx"]